@@ -0,0 +1,360 @@
+import argparse
+import http.server
+import json
+import multiprocessing
+import os
+import platform
+import random
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import pandas as pd
+
+import instrument
+from engine import COLUMN_ALIASES, aggregate, build_dataset, derive_rows, export, prepare
+from ingest import CHUNK_ROWS, SourceReader, ingest, read_frame
+from page import build_page
+from sync import SheetSync
+
+# BENCHMARKS (hors Streamlit)
+#   python bench.py scaling --sizes 1000 10000 100000
+#   python bench.py ui --sizes 1000 10000 50000   (navigateur headless : pip install playwright && playwright install chromium)
+#   python bench.py memory --sizes 100000 250000 500000   (pic RSS, Linux)
+#   python bench.py e2e --sizes 10000 100000 --source http   (sheet servi en local -> page ; résultats ajoutés à RESULTS)
+#   python bench.py compare   (dernier commit mesuré vs le précédent, par source et taille)
+
+GLOBALS = {"Jeu vidéo": ["PS5", "Switch", "PC", ""], "Livre": ["Roman", "BD", ""], "Film": ["", "Cinéma"], "Série": [""], "Manga": [""], "Anime": ["", "Film anime"], "": ["", "Podcast"]}
+RANKS = ["Parfait", "Coup de cœur", "Cool +", "Cool", "Sympa +", "Sympa", ""]
+GENRES = ["Action", "RPG", "Drame", "Comédie", "Horreur", "SF", "Fantasy", "Éducatif", "Aventure", "Romance"]
+TAGS = ["Cosy", "Triste", "Épique", "Court", "Long", "Rejouable", "Culte"]
+MOTS = ("le la les un une des et mais donc très trop assez vraiment histoire personnages fin début rythme musique ambiance "
+        "scénario direction artistique combat monde émotion lenteur surprise chef-d'œuvre déception relecture souvenir").split()
+EXTRA_COLUMNS = ["Plateforme", "Heures", "Notes perso"] # Colonnes du vrai sheet ignorées par l'app
+
+# Formats de date vus dans les sheets (poids) : jj/mm/aaaa surtout, mais aussi saisies libres et exports ISO
+DATE_FORMATS = [
+    (60, lambda d, m, y: f"{d:02d}/{m:02d}/{y}"),
+    (10, lambda d, m, y: f"{d}/{m}/{y}"),
+    (8, lambda d, m, y: f"{y}-{m:02d}-{d:02d}"),
+    (3, lambda d, m, y: f"{y}-{m:02d}-{d:02d} 00:00:00"),
+    (3, lambda d, m, y: f" {d:02d}/{m:02d}/{y} "),
+    (2, lambda d, m, y: f"{d} {MOIS[m - 1]} {y}"), # Illisible : repli sur la colonne suivante
+]
+MOIS = ["janvier", "février", "mars", "avril", "mai", "juin", "juillet", "août", "septembre", "octobre", "novembre", "décembre"]
+
+
+def random_date(r, empty=0.12):
+    if r.random() < empty: return None
+    d, m, y = r.randint(1, 28), r.randint(1, 12), r.choice([2022, 2023, 2024, 2025])
+    fmt = r.choices([f for _, f in DATE_FORMATS], weights=[w for w, _ in DATE_FORMATS])[0]
+    return fmt(d, m, y)
+
+
+def random_sessions(r):
+    # "Autres sessions" : aucune, ou une liste de dates jj/mm/aaaa en texte libre
+    k = r.choice([0, 0, 0, 1, 1, 2, 3])
+    if not k: return None
+    dates = [f"{r.randint(1, 28)}/{r.randint(1, 12):02d}/{r.choice([2022, 2023, 2024])}" for _ in range(k)]
+    return r.choice([", ", " puis ", " ; "]).join(dates)
+
+
+def random_review(r):
+    # Absente, courte, ou longue (plusieurs paragraphes, jusqu'à ~2 Ko)
+    k = r.random()
+    if k < 0.4: return None
+    if k < 0.7: return r.choice(["Bof", "Très bien.", "À refaire !", "Culte."])
+    paras = [" ".join(r.choices(MOTS, k=r.randint(10, 80))).capitalize() + "." for _ in range(r.randint(1, 5))]
+    return "\n".join(paras)
+
+
+def random_multi(r, values, k):
+    # "A, B" avec les défauts de saisie du vrai sheet (espaces, virgules en trop)
+    out = ", ".join(r.sample(values, r.randint(0, k)))
+    return out + r.choice(["", "", "", ",", " ", ", "]) if out else r.choice(["", "", None])
+
+
+def make_sheet(n, seed=0):
+    # Sheet synthétique : noms de colonnes tirés parmi les alias acceptés (resolve_columns), colonnes en trop,
+    # formats de date mélangés, sessions multiples, genres/tags multi-valués, reviews longues, titres en double
+    r = random.Random(seed)
+    names = {k: r.choice(v) for k, v in COLUMN_ALIASES.items()}
+    names["nom"] = r.choice(["Nom", " Nom "]) # Espaces retirés par prepare
+    rows = []
+    for i in range(n):
+        g = r.choice(list(GLOBALS))
+        rows.append({
+            names["nom"]: f"Œuvre {r.randint(0, i)}" if r.random() < 0.02 else f"Œuvre {i}",
+            names["glob"]: g,
+            names["det"]: r.choice(GLOBALS[g]),
+            names["rank"]: r.choice(RANKS),
+            names["debut"]: random_date(r),
+            names["fin"]: random_date(r, empty=0.3),
+            names["autre"]: random_sessions(r),
+            names["rev"]: random_review(r),
+            names["genre"]: random_multi(r, GENRES, 3),
+            names["tag"]: random_multi(r, TAGS, 2),
+            "Plateforme": r.choice(["", "PS5", "PC"]), "Heures": r.randint(0, 120), "Notes perso": "",
+        })
+    return pd.DataFrame(rows)
+
+
+def timed(fn, *args):
+    t = time.perf_counter()
+    out = fn(*args)
+    return out, time.perf_counter() - t
+
+
+def bench_scaling(sizes):
+    print(f"{'lignes':>8} {'dérivation':>11} {'agrégation':>11} {'export':>8} {'total':>8} {'µs/ligne':>9}")
+    for n in sizes:
+        df, c = prepare(make_sheet(n))
+        rows, t_derive = timed(derive_rows, df, c)
+        _, t_agg = timed(aggregate, rows)
+        _, t_export = timed(export, rows)
+        total = t_derive + t_agg + t_export
+        print(f"{n:>8} {t_derive:>10.3f}s {t_agg:>10.3f}s {t_export:>7.3f}s {total:>7.3f}s {total / n * 1e6:>9.1f}")
+
+
+def rss_mb():
+    # Pic de mémoire résidente du process, en Mo (VmHWM : contrairement à ru_maxrss, remis à zéro par exec)
+    with open("/proc/self/status") as f:
+        return next(int(l.split()[1]) for l in f if l.startswith("VmHWM")) / 1024
+
+
+def ingest_once(mode, path, chunksize):
+    # Exécuté dans un process neuf : -> (pic en Mo au-dessus de l'état après imports, durée), jusqu'au jeu exporté (Works)
+    base = rss_mb()
+    t = time.perf_counter()
+    if mode == "read_csv": # Ancien chemin : dtypes devinés, toutes les colonnes
+        out = build_dataset(pd.read_csv(path))
+    if mode == "complet": # Chemin de production sous RETRO_STREAM_MB (avec le cache de lignes de la synchro)
+        with open(path, "rb") as f: out = SheetSync(path).apply(read_frame(SourceReader(f)))
+    if mode == "flux": # Au-delà : lecture par blocs, magasin de lignes, ids et export
+        with open(path, "rb") as f: out = SheetSync(path).apply_stream(ingest(SourceReader(f), chunksize))
+    elapsed = time.perf_counter() - t
+    return rss_mb() - base, elapsed
+
+
+def bench_memory(sizes, chunksize):
+    # Mémoire de pointe du CSV au jeu exporté, par les chemins de sync.py ; octets/ligne à comparer d'une taille à l'autre
+    ctx = multiprocessing.get_context("spawn")
+    print(f"{'lignes':>8} {'CSV (Mo)':>9} {'mode':>9} {'pic (Mo)':>9} {'octets/ligne':>13} {'durée':>7}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in sizes:
+            path = os.path.join(tmp, f"{n}.csv")
+            make_sheet(n).to_csv(path, index=False)
+            size = os.path.getsize(path) / 2**20
+            for mode in ("read_csv", "complet", "flux"):
+                with ctx.Pool(1, maxtasksperchild=1) as pool:
+                    peak, elapsed = pool.apply(ingest_once, (mode, path, chunksize))
+                print(f"{n:>8} {size:>9.1f} {mode:>9} {peak:>9.0f} {peak * 2**20 / n:>13.0f} {elapsed:>6.1f}s")
+
+
+# BOUT EN BOUT : sheet servi en local (fichier ou HTTP) -> synchro -> page, dans un process neuf par mesure
+RESULTS = os.environ.get("RETRO_BENCH_RESULTS", os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_results.jsonl"))
+SYNC_STAGES = ("fetch", "download", "ingest", "parse", "derive", "export", "payload", "page")
+
+
+class SheetHandler(http.server.BaseHTTPRequestHandler):
+    # Remplaçant local de l'export Google : ETag / 304 comme le vrai, corps envoyé en flux
+    def do_GET(self):
+        path = self.server.path
+        st = os.stat(path)
+        etag = f'"{st.st_mtime_ns}-{st.st_size}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/csv; charset=utf-8")
+        self.send_header("Content-Length", str(st.st_size))
+        self.send_header("ETag", etag)
+        self.end_headers()
+        with open(path, "rb") as f: shutil.copyfileobj(f, self.wfile)
+
+    def log_message(self, *args): pass
+
+
+def serve(path):
+    # -> (serveur, url) ; serveur HTTP local dans un thread
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), SheetHandler)
+    server.path = path
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}/export"
+
+
+def edit_sheet(path, share, seed=1):
+    # Modifie une part des reviews (synchro incrémentale : seules ces lignes sont re-dérivées)
+    df = pd.read_csv(path, dtype=str, keep_default_na=False)
+    rev = next(c for c in COLUMN_ALIASES["rev"] if c in df.columns)
+    idx = df.sample(frac=share, random_state=seed).index
+    df.loc[idx, rev] = df.loc[idx, rev] + " (relu)"
+    df.to_csv(path, index=False)
+    time.sleep(0.01) # mtime différent -> nouvel ETag
+
+
+def cold_stages():
+    # Durées (ms) des étapes du premier chargement, depuis le journal d'instrument.py
+    out = {}
+    for ev in instrument.events:
+        if ev["stage"] in SYNC_STAGES and ev["stage"] not in out: out[ev["stage"]] = ev["ms"]
+    return out
+
+
+def e2e_once(source, path):
+    # Exécuté dans un process neuf (caches froids) -> mesures d'un chargement complet, puis inchangé, puis modifié
+    base = rss_mb()
+    server = None
+    if source == "http":
+        server, url = serve(path)
+        sync = SheetSync(url)
+        load = sync.sync
+    else:
+        sync = SheetSync(path)
+        def load():
+            with open(path, "rb") as f:
+                src = SourceReader(f)
+                if os.path.getsize(path) >= sync.stream_min_bytes:
+                    with instrument.stage("ingest"): out = ingest(src)
+                    return sync.apply_stream(out)
+                with instrument.stage("parse"): df = read_frame(src)
+                return sync.apply(df)
+
+    dataset, t_load = timed(load)
+    html, t_page = timed(build_page, "bench", dataset, False)
+    out = {"load_s": t_load, "page_s": t_page, "total_s": t_load + t_page, "peak_mb": rss_mb() - base,
+           "works": len(dataset[0]), "html_kb": len(html.encode()) / 1024,
+           "payload_kb": {k: v / 1024 for k, v in instrument.recent("page", limit=1)[0]["bytes"].items()},
+           "stages_ms": cold_stages()}
+    if server: # Relectures servies par le thread de fond en production
+        out["unchanged_s"] = timed(sync.sync)[1]
+        edit_sheet(path, 0.01)
+        out["edit_1pct_s"] = timed(sync.sync)[1]
+        server.shutdown()
+    return out
+
+
+def git_commit():
+    try:
+        head = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True, text=True).stdout.strip()
+        return head + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return "?"
+
+
+def bench_e2e(sizes, source, repeat, results):
+    # Médiane de `repeat` mesures par taille ; une ligne JSON par taille ajoutée à `results`
+    ctx = multiprocessing.get_context("spawn")
+    run = {"commit": git_commit(), "date": datetime.now().isoformat(timespec="seconds"), "source": source,
+           "python": platform.python_version(), "pandas": pd.__version__, "machine": platform.node()}
+    print(f"{'lignes':>8} {'CSV (Mo)':>9} {'charg.':>8} {'page':>7} {'total':>7} {'inchangé':>9} {'modif 1%':>9} {'pic (Mo)':>9} {'page (Ko)':>10}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in sizes:
+            sheet, path = os.path.join(tmp, f"{n}.csv"), os.path.join(tmp, "export.csv")
+            make_sheet(n).to_csv(sheet, index=False)
+            size = os.path.getsize(sheet) / 2**20
+            runs = []
+            for _ in range(repeat):
+                shutil.copyfile(sheet, path) # Copie neuve : edit_sheet modifie le fichier servi
+                with ctx.Pool(1, maxtasksperchild=1) as pool:
+                    runs.append(pool.apply(e2e_once, (source, path)))
+            res = sorted(runs, key=lambda x: x["total_s"])[len(runs) // 2]
+            resync = [f"{res[k]:>8.3f}s" if k in res else f"{'-':>9}" for k in ("unchanged_s", "edit_1pct_s")] # HTTP seulement
+            print(f"{n:>8} {size:>9.1f} {res['load_s']:>7.2f}s {res['page_s']:>6.2f}s {res['total_s']:>6.2f}s "
+                  f"{resync[0]} {resync[1]} {res['peak_mb']:>9.0f} {res['html_kb']:>10.0f}")
+            with open(results, "a") as f:
+                f.write(json.dumps({**run, "rows": n, "csv_mb": size, "repeat": repeat, **res}) + "\n")
+    print(f"-> {results}")
+
+
+COMPARED = ("load_s", "page_s", "total_s", "unchanged_s", "edit_1pct_s", "peak_mb", "html_kb")
+
+
+def bench_compare(results, threshold):
+    # Dernier commit mesuré vs le précédent, par (source, lignes) ; "!" au-delà de `threshold` % de hausse
+    with open(results) as f: lines = [json.loads(l) for l in f if l.strip()]
+    latest = {} # (source, lignes) -> {commit: dernière mesure}, commits dans l'ordre de mesure
+    for l in lines:
+        by_commit = latest.setdefault((l["source"], l["rows"]), {})
+        by_commit.pop(l["commit"], None) # Remesuré : le commit passe en dernier
+        by_commit[l["commit"]] = l
+    for (source, n), by_commit in sorted(latest.items()):
+        if len(by_commit) < 2: continue
+        (old_c, old), (new_c, new) = list(by_commit.items())[-2:]
+        print(f"{source} {n} lignes : {old_c} -> {new_c}")
+        for k in COMPARED:
+            if k not in old or k not in new: continue
+            delta = (new[k] - old[k]) / old[k] * 100 if old[k] else 0.0
+            print(f"  {k:>12} {old[k]:>10.3f} {new[k]:>10.3f} {delta:>+7.1f}% {'!' if delta > threshold else ''}")
+
+
+# Bascule d'un filtre global puis retour, mesurée jusqu'à la frame suivante
+TOGGLE_JS = """async (repeat) => {
+    const frame = () => new Promise(r => requestAnimationFrame(() => setTimeout(r, 0)));
+    const out = [];
+    for(let i = 0; i < repeat; i++) {
+        const g = GLOBALS[i % GLOBALS.length];
+        for(let k = 0; k < 2; k++) {
+            const t = performance.now();
+            toggleF('global', g);
+            await frame();
+            out.push(performance.now() - t);
+        }
+    }
+    return out;
+}"""
+
+
+def bench_ui(sizes, repeat):
+    try:
+        from playwright.sync_api import sync_playwright
+    except ImportError:
+        print("playwright manquant : pip install playwright && playwright install chromium")
+        return
+
+    print(f"{'œuvres':>8} {'page (Ko)':>10} {'1er rendu':>10} {'filtre médian':>14} {'filtre max':>11}")
+    with sync_playwright() as p:
+        browser = p.chromium.launch()
+        for n in sizes:
+            html = build_page("bench", build_dataset(make_sheet(n)), reviews=False)
+            page = browser.new_page(viewport={"width": 1280, "height": 900})
+            page.route("**/fonts.googleapis.com/**", lambda route: route.abort())
+            page.set_content(html, wait_until="domcontentloaded")
+            first = page.evaluate("() => { const t = performance.now(); nav('timeline'); return performance.now() - t; }")
+            times = sorted(page.evaluate(TOGGLE_JS, repeat))
+            print(f"{n:>8} {len(html.encode()) / 1024:>10.0f} {first:>8.1f}ms {times[len(times) // 2]:>12.1f}ms {times[-1]:>9.1f}ms")
+            page.close()
+        browser.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("scaling", help="temps de build_dataset par étape selon le nombre de lignes")
+    p.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    p = sub.add_parser("ui", help="latence d'un changement de filtre dans la page (navigateur headless)")
+    p.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    p.add_argument("--repeat", type=int, default=5)
+    p = sub.add_parser("memory", help="mémoire de pointe du CSV au jeu exporté : read_csv complet vs lecture par blocs")
+    p.add_argument("--sizes", type=int, nargs="+", default=[100000, 250000, 500000])
+    p.add_argument("--chunksize", type=int, default=CHUNK_ROWS)
+    p = sub.add_parser("e2e", help="sheet servi en local -> synchro -> page : durées, taille de page, pic mémoire (enregistrés)")
+    p.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    p.add_argument("--source", choices=["http", "file"], default="http")
+    p.add_argument("--repeat", type=int, default=3)
+    p.add_argument("--results", default=RESULTS)
+    p = sub.add_parser("compare", help="compare les deux derniers commits mesurés par e2e")
+    p.add_argument("--results", default=RESULTS)
+    p.add_argument("--threshold", type=float, default=10.0)
+    args = parser.parse_args()
+
+    if args.cmd == "scaling": bench_scaling(args.sizes)
+    if args.cmd == "ui": bench_ui(args.sizes, args.repeat)
+    if args.cmd == "memory": bench_memory(args.sizes, args.chunksize)
+    if args.cmd == "e2e": bench_e2e(args.sizes, args.source, args.repeat, args.results)
+    if args.cmd == "compare": bench_compare(args.results, args.threshold)
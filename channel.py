@@ -0,0 +1,92 @@
+import json
+import threading
+from collections import OrderedDict
+
+from instrument import stage
+from page import AGGREGATES, payload_json, payload_parts
+from payload import LOCAL_SHEET, MIN_REVIEW_LEN, REVIEW_PAGE_SIZE, split_payload, work_tokens
+
+# CANAL DE DONNÉES VERSIONNÉ (page servie comme composant Streamlit, cf. app.py)
+# La page reste chargée d'une version à l'autre et renvoie la version qu'elle affiche ; on lui envoie alors
+# - rien de plus si elle est à jour,
+# - un delta si on a encore sa version : œuvres ajoutées / modifiées (par id stable), ordre en plages et agrégats
+#   qui ont changé ; le client recalcule le reste (facettes, recherche, pages de reviews) et garde filtres et scroll,
+# - sinon le jeu complet.
+# Messages en JSON encodé (arg binaire du composant : pas réencodé dans le JSON des args)
+
+HISTORY = 3 # Versions gardées par sheet pour servir des deltas
+
+
+class History:
+    # Derniers jeux de données de chaque sheet, par version (références partagées avec le loader, pas de copie).
+    # Par sheet : les autres sheets ne poussent pas dehors la version qu'une page affiche encore
+    def __init__(self, size=HISTORY):
+        self.size = size
+        self.sheets = {} # sheet_id -> OrderedDict version -> jeu de données
+        self.lock = threading.Lock()
+
+    def add(self, sheet_id, version, dataset):
+        with self.lock:
+            items = self.sheets.setdefault(sheet_id, OrderedDict())
+            items[version] = dataset
+            items.move_to_end(version)
+            while len(items) > self.size: items.popitem(last=False)
+
+    def get(self, sheet_id, version):
+        with self.lock:
+            return self.sheets.get(sheet_id, {}).get(version)
+
+    def drop(self, sheet_id):
+        # Sheet évincé par le loader : ses versions sont libérées avec lui (plafond mémoire du loader)
+        with self.lock:
+            self.sheets.pop(sheet_id, None)
+
+
+def fingerprints(works):
+    # Ce que le client affiche de chaque œuvre, en valeurs (les codes changent avec les vocabulaires)
+    cols = [works.nom, [len(r) > MIN_REVIEW_LEN for r in works.review], works.day.tolist()]
+    cols += [works.column(k) for k in ("global", "media", "rank", "sort_key")]
+    cols += [map(tuple, works.column(k)) for k in ("genres", "tags")]
+    return dict(zip(works.id, zip(*cols)))
+
+
+def diff(old, new):
+    # -> (ordre en plages [début, longueur, ...], positions dans new des œuvres à envoyer)
+    # début >= 0 : positions old consécutives ; début < 0 : œuvres envoyées, à partir du rang -1 - début
+    before, at = fingerprints(old), {i: k for k, i in enumerate(old.id)}
+    order, sent = [], []
+    for k, (i, fp) in enumerate(fingerprints(new).items()):
+        if before.get(i) == fp: a = at[i]
+        else:
+            a = -1 - len(sent)
+            sent.append(k)
+        if order and (a >= 0) == (order[-2] >= 0) and a == (order[-2] + order[-1] if a >= 0 else order[-2] - order[-1]): order[-1] += 1
+        else: order += [a, 1]
+    return order, sent
+
+
+def full_message(version, dataset, reviews=True, sheet=LOCAL_SHEET):
+    with stage("message", version=version, kind="full") as ev:
+        msg = '{"version":%s,"payload":%s}' % (json.dumps(version), payload_json(version, dataset, reviews, sheet))
+        ev["bytes"] = len(msg)
+        return msg.encode()
+
+
+def delta_message(base, base_dataset, version, dataset, reviews=True, sheet=LOCAL_SHEET):
+    works = dataset[0]
+    with stage("message", version=version, base=base, kind="delta", works=len(works)) as ev:
+        order, sent = diff(base_dataset[0], works)
+        upserts = works.take(sent)
+        index, _ = split_payload(upserts) # "rp" : seulement le drapeau review / pas de review, renumérotée par le client
+        parts, before = payload_parts(version, dataset, reviews, sheet), payload_parts(base, base_dataset, reviews, sheet)
+        payload = {name: parts[name]() for name in AGGREGATES}
+        payload = {name: v for name, v in payload.items() if json.dumps(v) != json.dumps(before[name]())}
+        payload["REVIEWS_URL"] = parts["REVIEWS_URL"]() # Pages de la nouvelle version (numéros décalés par les ajouts)
+        msg = json.dumps({"version": version, "base": base, "order": order, "index": index, "page_size": REVIEW_PAGE_SIZE,
+                          "search": [sorted(t) for t in work_tokens(upserts)], "payload": payload})
+        ev.update(bytes=len(msg), sent=len(sent), runs=len(order) // 2, aggregates=sorted(payload))
+        return msg.encode()
+
+
+def current_message(version):
+    return json.dumps({"version": version}).encode()
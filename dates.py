@@ -0,0 +1,121 @@
+import re
+import threading
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+# RÉSOLUTION DES DATES : Fin -> Début -> dernière date jj/mm/aaaa de "Autres sessions"
+# Les sheets répètent beaucoup les mêmes chaînes : chaque valeur brute distincte est analysée une seule fois
+# puis gardée (cache borné, partagé entre blocs et synchros du process).
+# Chemins rapides jj/mm/aaaa et ISO (aaaa-mm-jj, éventuellement suivi de 00:00:00) ; le reste passe par pandas
+# (format strict jj/mm/aaaa puis "mixed" dayfirst, comme avant).
+
+DMY_RE = re.compile(r'(\d{1,2})/(\d{1,2})/(\d{4})')
+ISO_RE = re.compile(r'(\d{4})-(\d{2})-(\d{2})(?:[ T]00:00:00)?')
+SESSION_DATE_RE = re.compile(r'\d{1,2}/\d{1,2}/\d{4}')
+MAX_ENTRIES = 100_000
+MIN_YEAR, MAX_YEAR = 1678, 2261 # Bornes des datetime64[ns] : hors bornes = pas de date
+
+
+def fast_date(v):
+    # -> datetime64 pour les formats courants (NaT hors bornes), None si pandas doit trancher
+    m = DMY_RE.fullmatch(v)
+    if m: d, mo, y = map(int, m.groups())
+    else:
+        m = ISO_RE.fullmatch(v)
+        if not m: return None
+        y, mo, d = map(int, m.groups())
+    if not MIN_YEAR <= y <= MAX_YEAR: return np.datetime64("NaT")
+    try: return np.datetime64(date(y, mo, d), "ns")
+    except ValueError: return None # Date impossible : pandas tranche (ex. 2024-13-05 lu aaaa-jj-mm)
+
+
+def slow_dates(values):
+    # Chemin pandas : format strict puis analyse au cas par cas (dayfirst)
+    s = pd.Series(values, dtype=object)
+    out = pd.to_datetime(s, format="%d/%m/%Y", errors='coerce')
+    rest = out.isna() & s.notna()
+    if rest.any():
+        out[rest] = pd.to_datetime(s[rest].astype(str), format="mixed", dayfirst=True, errors='coerce')
+    out = out.where(out.dt.year.between(MIN_YEAR, MAX_YEAR))
+    return out.dt.as_unit("ns").to_numpy()
+
+
+class DateResolver:
+    def __init__(self, max_entries=MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.dates = {} # valeur brute -> datetime64[ns] (NaT si illisible)
+        self.sessions = {} # texte "Autres sessions" -> dernière date trouvée (None si aucune)
+        self.lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "fast": 0, "slow": 0}
+
+    def remember(self, memo, key, value):
+        if len(memo) >= self.max_entries: memo.clear()
+        memo[key] = value
+
+    def parse(self, values):
+        # Colonne (Series / liste) -> datetime64[ns] ; une analyse par valeur distincte jamais vue
+        codes, uniques = pd.factorize(pd.Series(values, dtype=object))
+        uniques = list(uniques)
+        out = np.empty(len(uniques) + 1, dtype="datetime64[ns]")
+        out[-1] = np.datetime64("NaT") # code -1 = valeur vide
+        slow = []
+        with self.lock:
+            for k, v in enumerate(uniques):
+                hit = self.dates.get(v) if isinstance(v, str) else None
+                if hit is not None:
+                    out[k] = hit
+                    self.counters["hits"] += 1
+                    continue
+                self.counters["misses"] += 1
+                fast = fast_date(v) if isinstance(v, str) else None
+                if fast is None: slow.append(k)
+                else:
+                    out[k] = fast
+                    self.counters["fast"] += 1
+                    self.remember(self.dates, v, fast)
+        if slow:
+            # pandas hors du verrou : les synchros simultanées (pool de téléchargement) ne s'attendent pas
+            parsed = slow_dates([uniques[k] for k in slow])
+            with self.lock:
+                self.counters["slow"] += len(slow)
+                for k, p in zip(slow, parsed):
+                    out[k] = p
+                    if isinstance(uniques[k], str): self.remember(self.dates, uniques[k], p)
+        return out[codes]
+
+    def last_session(self, values):
+        # Texte des autres sessions -> dernière date jj/mm/aaaa trouvée (None si aucune), par valeur distincte
+        codes, uniques = pd.factorize(pd.Series(values, dtype=object))
+        found = []
+        with self.lock:
+            for v in uniques:
+                key = str(v)
+                if key not in self.sessions:
+                    dates = SESSION_DATE_RE.findall(key)
+                    self.remember(self.sessions, key, dates[-1] if dates else None)
+                found.append(self.sessions[key])
+        found.append(None)
+        return [found[c] for c in codes]
+
+    def resolve(self, fin=None, debut=None, sessions=None, index=None):
+        # Colonnes brutes (Series ou None) -> Series datetime64[ns] : Fin, sinon Début, sinon dernière session
+        ref = pd.Series(pd.NaT, index=index, dtype="datetime64[ns]")
+        for col in (fin, debut):
+            if col is not None:
+                ref = ref.fillna(pd.Series(self.parse(col), index=index))
+        if sessions is not None:
+            missing = ref.isna().to_numpy()
+            if missing.any():
+                last = self.last_session(sessions[missing])
+                ref[missing] = self.parse(last)
+        return ref
+
+    def stats(self):
+        with self.lock:
+            n = self.counters["hits"] + self.counters["misses"]
+            return dict(self.counters, size=len(self.dates), hit_rate=self.counters["hits"] / n if n else 0.0)
+
+
+RESOLVER = DateResolver() # Un par process (les workers du process pool ont le leur)
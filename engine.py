@@ -0,0 +1,369 @@
+import hashlib
+from itertools import chain
+
+import numpy as np
+import pandas as pd
+
+from dates import RESOLVER
+
+# MOTEUR COLONNAIRE : même sortie que l'ancienne boucle itertuples, mais colonne par colonne
+
+# Alias acceptés pour chaque champ (premier trouvé gagnant)
+COLUMN_ALIASES = {
+    "nom": ['Nom'],
+    "glob": ['Média global', 'Media global', 'Global'],
+    "det": ['Média', 'Media'],
+    "rank": ['Rank', 'Classement'],
+    "debut": ['Début', 'Debut'],
+    "fin": ['Fin', 'End'],
+    "autre": ['Autres sessions', 'Sessions'], # Pour la date de secours
+    "rev": ['Review'],
+    "genre": ['Genres'],
+    "tag": ['Tags'],
+}
+
+MOIS_FR = {1:'JANVIER', 2:'FÉVRIER', 3:'MARS', 4:'AVRIL', 5:'MAI', 6:'JUIN', 7:'JUILLET', 8:'AOÛT', 9:'SEPTEMBRE', 10:'OCTOBRE', 11:'NOVEMBRE', 12:'DÉCEMBRE'}
+RANK_ORDER = ["Parfait", "Coup de cœur", "Cool +", "Cool", "Sympa +", "Sympa", "Sans Rank"]
+NO_DATE_SORT = 999999
+
+def empty_dataset():
+    return Works.empty(), {"media":{}, "rank":{}, "genre":{}, "tag":{}}, {}, []
+
+
+def resolve_columns(columns):
+    cols = list(columns)
+    def find_c(possible_names):
+        for p in possible_names:
+            if p in cols: return p
+        return None
+    return {k: find_c(v) for k, v in COLUMN_ALIASES.items()}
+
+
+def clean_text(df, col):
+    # Equivalent colonne de get_val : str() + strip, 'nan' -> ""
+    if not col: return pd.Series("", index=df.index, dtype=object)
+    s = df[col]
+    v = s.astype(object).where(s.notna(), "").astype(str).str.strip()
+    return v.mask(v.str.lower() == 'nan', "")
+
+
+def resolve_dates(df, c):
+    # Fin -> Début -> dernière date trouvée dans "Autres sessions" (voir dates.py)
+    col = lambda key: df[c[key]] if c[key] else None
+    sessions = clean_text(df, c["autre"]) if c["autre"] else None
+    return RESOLVER.resolve(col("fin"), col("debut"), sessions, index=df.index)
+
+
+def date_fields(ref):
+    # Libellés calculés une fois par date distincte (peu de dates différentes pour beaucoup de lignes)
+    codes, uniques = pd.factorize(ref)
+    uniques = pd.DatetimeIndex(uniques)
+    sort = (uniques.year * 100 + uniques.month).to_numpy(dtype="int64")
+    fields = {
+        "mois_display": [f"{MOIS_FR[m]} {y}" for m, y in zip(uniques.month, uniques.year)] + ["INCONNU"],
+        "sort_key": sort.tolist() + [NO_DATE_SORT],
+        "date_aff": uniques.strftime("%d/%m").tolist() + ["?"],
+        "date_full": uniques.strftime("%d/%m/%Y").tolist() + ["?"],
+    }
+    return {k: [v[i] for i in codes] for k, v in fields.items()} # code -1 -> dernière entrée (pas de date)
+
+
+def split_multi(v):
+    # "A, B,," -> liste par ligne + série à plat (ordre d'apparition)
+    parts = v.reset_index(drop=True).str.split(',').explode().str.strip()
+    parts = parts[parts.notna() & (parts != "")]
+    vals = parts.to_numpy(dtype=object)
+    counts = np.bincount(parts.index.to_numpy(dtype="int64"), minlength=len(v))
+    lists = [a.tolist() for a in np.split(vals, np.cumsum(counts)[:-1])] if len(v) else []
+    return lists, parts
+
+
+EXPORT_KEYS = ["id", "nom", "unique_key", "global", "media", "rank", "genres", "tags", "mois_display", "sort_key", "date_aff", "date_full", "review"]
+
+
+def prepare(df):
+    # On garde les noms de colonnes originaux mais on strip les espaces
+    df = df.copy()
+    df.columns = [str(c).strip() for c in df.columns]
+    return df, resolve_columns(df.columns)
+
+
+def derive_rows(df, c):
+    # Champs dérivés ligne à ligne (indépendants des autres lignes) -> colonnes (listes)
+    df = df.dropna(subset=[c["nom"]])
+    nom = clean_text(df, c["nom"])
+    keep = nom != ""
+    df, nom = df[keep], nom[keep]
+
+    m_glob = clean_text(df, c["glob"]).replace("", "Autre")
+    m_det = clean_text(df, c["det"])
+    m_det = m_det.mask(m_det == "", m_glob)
+    rank = clean_text(df, c["rank"]).replace("", "Sans Rank")
+
+    # Dates
+    dates = date_fields(resolve_dates(df, c))
+
+    gs, _ = split_multi(clean_text(df, c["genre"]))
+    ts, _ = split_multi(clean_text(df, c["tag"]))
+
+    cols = {
+        "id": df.index.astype(str), "nom": nom, "unique_key": nom.str.lower(),
+        "global": m_glob, "media": m_det, "rank": rank,
+        "genres": gs, "tags": ts,
+        **dates,
+        "review": clean_text(df, c["rev"]).str.replace('\n', '<br>', regex=False),
+    }
+    return {k: (v if isinstance(v, list) else v.tolist()) for k, v in cols.items()}
+
+
+def to_columns(records):
+    return {k: [r[k] for r in records] for k in EXPORT_KEYS}
+
+
+INTERNED_KEYS = ("global", "media", "rank", "mois_display", "sort_key", "date_aff", "date_full")
+
+
+class RecordStore:
+    # Colonnes dérivées en ajout seul (ingestion par blocs). Les valeurs répétées d'une ligne à l'autre
+    # (médias, ranks, mois, dates, combinaisons de genres / tags) sont partagées au lieu d'être un objet par ligne ;
+    # les ids provisoires ne sont pas gardés (assign_ids les pose sur l'ensemble).
+
+    def __init__(self):
+        self.cols = {k: [] for k in EXPORT_KEYS if k != "id"}
+        self.values = {}
+
+    def intern(self, v):
+        return self.values.setdefault(v, v)
+
+    def append(self, rows):
+        intern = self.intern
+        for k, col in self.cols.items():
+            if k in INTERNED_KEYS: col.extend(map(intern, rows[k]))
+            elif k in ("genres", "tags"): col.extend([intern(tuple(map(intern, v))) for v in rows[k]])
+            else: col.extend(rows[k])
+        return self
+
+    def __len__(self):
+        return len(self.cols["nom"])
+
+
+def order_ranks(counts):
+    # Ordre fixe des ranks connus, puis les autres dans l'ordre d'apparition ; on retire les vides
+    ranks = {k: counts.get(k, 0) for k in RANK_ORDER}
+    ranks.update({k: v for k, v in counts.items() if k not in ranks})
+    return {k: v for k, v in ranks.items() if v > 0}
+
+
+def list_medias(rows):
+    # Index média -> global du premier passage (dict = ordre d'insertion conservé)
+    index = {}
+    for m, g in zip(rows["media"], rows["global"]):
+        if m not in index: index[m] = g
+    return [{'media': m, 'global': g} for m, g in index.items()]
+
+
+class Accumulator:
+    # Compteurs media / rank / genre / tag / histo remplis en une seule passe sur les lignes dérivées.
+    # add(rows, -1) retire des lignes (synchro incrémentale) ; les clés retombées à 0 disparaissent.
+
+    def __init__(self):
+        self.media, self.rank, self.genre, self.tag = {}, {}, {}, {}
+        self.histo = {}
+
+    def add(self, rows, sign=1):
+        media, rank, genre, tag, histo = self.media, self.rank, self.genre, self.tag, self.histo
+        for m_glob, m_det, rk, gs, ts, m_sort, m_lbl in zip(rows["global"], rows["media"], rows["rank"], rows["genres"], rows["tags"], rows["sort_key"], rows["mois_display"]):
+            media[m_glob] = media.get(m_glob, 0) + sign
+            if m_det != m_glob: media[m_det] = media.get(m_det, 0) + sign
+            rank[rk] = rank.get(rk, 0) + sign
+            for g in gs: genre[g] = genre.get(g, 0) + sign
+            for t in ts: tag[t] = tag.get(t, 0) + sign
+
+            if m_sort < NO_DATE_SORT: # Si date valide
+                h = histo.get(m_sort)
+                if h is None: h = histo[m_sort] = {"label": m_lbl, "total": 0, "sort": m_sort, "breakdown": {}}
+                h["total"] += sign
+                h["breakdown"][m_glob] = h["breakdown"].get(m_glob, 0) + sign
+        if sign < 0: self.prune()
+        return self
+
+    def prune(self):
+        for counts in (self.media, self.rank, self.genre, self.tag):
+            for k in [k for k, v in counts.items() if v <= 0]: del counts[k]
+        for s in [s for s, h in self.histo.items() if h["total"] <= 0]: del self.histo[s]
+        for h in self.histo.values():
+            for g in [g for g, v in h["breakdown"].items() if v <= 0]: del h["breakdown"][g]
+
+    def reorder(self, rows):
+        # Après des deltas, clés remises dans l'ordre d'une construction complète sur rows (premier passage dans
+        # l'ordre du sheet) : les clés ajoutées arrivent sinon en fin de dict, et une clé peut avoir perdu sa première ligne
+        first = lambda keys, counts: {k: counts[k] for k in dict.fromkeys(keys) if k in counts}
+        self.media = first(chain.from_iterable(zip(rows["global"], rows["media"])), self.media)
+        self.rank = first(rows["rank"], self.rank)
+        self.genre = first(chain.from_iterable(rows["genres"]), self.genre)
+        self.tag = first(chain.from_iterable(rows["tags"]), self.tag)
+        months = {}
+        for s, g in dict.fromkeys(zip(rows["sort_key"], rows["global"])): months.setdefault(s, []).append(g)
+        self.histo = first(months, self.histo)
+        for s, h in self.histo.items(): h["breakdown"] = first(months[s], h["breakdown"])
+        return self
+
+    def stats(self):
+        return {"media": dict(self.media), "rank": order_ranks(self.rank), "genre": dict(self.genre), "tag": dict(self.tag)}
+
+    def histo_data(self):
+        return {s: dict(h, breakdown=dict(h["breakdown"])) for s, h in self.histo.items()}
+
+
+def aggregate(rows):
+    # Stats / Histo / médias uniques à partir des colonnes dérivées
+    acc = Accumulator().add(rows)
+    return acc.stats(), acc.histo_data(), list_medias(rows)
+
+
+def to_records(rows, order=None):
+    if order is None: order = range(len(rows["id"]))
+    return [{k: rows[k][i] for k in EXPORT_KEYS} for i in order]
+
+
+def month_label(sort_key):
+    return f"{MOIS_FR[sort_key % 100]} {sort_key // 100}" if sort_key < NO_DATE_SORT else "INCONNU"
+
+
+def encode(values, index, order=None):
+    # Valeurs -> codes int32 (lues aux positions order si donné, sans copie de la colonne) ;
+    # index (valeur -> code) complété dans l'ordre d'apparition
+    n = len(values if order is None else order)
+    if order is not None: values = map(values.__getitem__, order)
+    return np.fromiter((index.setdefault(v, len(index)) for v in values), dtype=np.int32, count=n)
+
+
+def encode_lists(lists, index, order=None):
+    # Listes par ligne -> (offsets, codes à plat) : les valeurs de la ligne i sont codes[offsets[i]:offsets[i + 1]]
+    rows = range(len(lists)) if order is None else order
+    offsets = np.zeros(len(rows) + 1, dtype=np.int32)
+    np.cumsum(np.fromiter((len(lists[i]) for i in rows), dtype=np.int32, count=len(rows)), out=offsets[1:])
+    flat = (v for i in rows for v in lists[i])
+    return offsets, np.fromiter((index.setdefault(v, len(index)) for v in flat), dtype=np.int32, count=int(offsets[-1]))
+
+
+# Colonne codée -> vocabulaire (global et media partagent le même)
+VOCABS = {"global": "media", "media": "media", "rank": "rank", "month": "month", "genres": "genre", "tags": "tag"}
+
+
+class Works:
+    # db_export compact, dans l'ordre d'export : codes entiers dans des vocabulaires partagés pour médias, ranks,
+    # mois (sort_key), genres et tags (offsets pour ces deux-là), jour du mois en uint8 (0 = pas de date).
+    # Seuls id / nom / review restent des chaînes ; unique_key, mois_display et les dates affichées se recalculent.
+
+    def __init__(self, ids, nom, review, codes, day, offsets, vocab):
+        self.id, self.nom, self.review = ids, nom, review
+        self.codes = codes # global / media / rank / month / genres / tags -> np.int32
+        self.day = day
+        self.offsets = offsets # genres / tags -> np.int32 (len(self) + 1)
+        self.vocab = vocab # media / rank / month / genre / tag -> liste de valeurs
+
+    @classmethod
+    def build(cls, rows, order=None):
+        # Colonnes dérivées (listes, cf. derive_rows) -> Works, dans l'ordre donné. Les colonnes codées sont lues
+        # directement à ces positions : pas de copie réordonnée des colonnes en plus du magasin de lignes
+        index = {k: {} for k in ("media", "rank", "month", "genre", "tag")}
+        codes = {k: encode(rows[k], index[VOCABS[k]], order) for k in ("global", "media", "rank")}
+        codes["month"] = encode(rows["sort_key"], index["month"], order)
+        offsets = {}
+        for k in ("genres", "tags"):
+            offsets[k], codes[k] = encode_lists(rows[k], index[VOCABS[k]], order)
+        dates = rows["date_aff"] if order is None else map(rows["date_aff"].__getitem__, order)
+        day = np.fromiter((0 if d == "?" else int(d[:2]) for d in dates), dtype=np.uint8, count=len(codes["month"]))
+        text = {k: rows[k] if order is None else [rows[k][i] for i in order] for k in ("id", "nom", "review")}
+        return cls(text["id"], text["nom"], text["review"], codes, day, offsets, {k: list(v) for k, v in index.items()})
+
+    @classmethod
+    def empty(cls):
+        return cls.build(to_columns([]))
+
+    def __len__(self):
+        return len(self.nom)
+
+    def column(self, key):
+        # Colonne décodée, valeurs identiques à l'ancien db_export
+        if key in ("id", "nom", "review"): return getattr(self, key)
+        if key == "unique_key": return [s.lower() for s in self.nom]
+        if key in ("global", "media", "rank"):
+            vocab = self.vocab[VOCABS[key]]
+            return [vocab[c] for c in self.codes[key].tolist()]
+        if key in ("genres", "tags"):
+            vocab, off, codes = self.vocab[VOCABS[key]], self.offsets[key].tolist(), self.codes[key].tolist()
+            return [[vocab[c] for c in codes[a:b]] for a, b in zip(off, off[1:])]
+
+        months = self.codes["month"].tolist()
+        if key == "sort_key": return [self.vocab["month"][c] for c in months]
+        if key == "mois_display":
+            labels = [month_label(s) for s in self.vocab["month"]]
+            return [labels[c] for c in months]
+        dates = []
+        for c, d in zip(months, self.day.tolist()):
+            s = self.vocab["month"][c]
+            if s >= NO_DATE_SORT: dates.append("?")
+            elif key == "date_aff": dates.append(f"{d:02d}/{s % 100:02d}")
+            else: dates.append(f"{d:02d}/{s % 100:02d}/{s // 100}")
+        return dates
+
+    def take(self, positions):
+        # Sous-ensemble (positions, dans l'ordre donné) qui garde les vocabulaires : mêmes codes que self
+        pos = np.asarray(positions, dtype=np.int64)
+        codes = {k: self.codes[k][pos] for k in ("global", "media", "rank", "month")}
+        offsets = {}
+        for k in ("genres", "tags"):
+            off = self.offsets[k]
+            counts = (off[1:] - off[:-1])[pos]
+            offsets[k] = np.concatenate([[0], np.cumsum(counts)]).astype(np.int32)
+            codes[k] = self.codes[k][np.repeat(off[:-1][pos] - offsets[k][:-1], counts) + np.arange(offsets[k][-1])]
+        pick = lambda col: [col[p] for p in pos.tolist()]
+        return Works(pick(self.id), pick(self.nom), pick(self.review), codes, self.day[pos], offsets, self.vocab)
+
+    def rows(self):
+        return {k: self.column(k) for k in EXPORT_KEYS}
+
+    def records(self):
+        # Liste de dicts (forme historique de db_export)
+        return to_records(self.rows())
+
+
+def export(rows):
+    # TRI CHRONOLOGIQUE (Ascendant), stable comme sorted()
+    order = pd.DataFrame({"s": rows["sort_key"], "d": rows["date_aff"]}, dtype=object).sort_values(["s", "d"], kind="stable").index
+    return Works.build(rows, order.tolist())
+
+
+def work_id(*parts):
+    return hashlib.sha1("\x1f".join(parts).encode("utf-8")).hexdigest()[:10]
+
+
+def assign_ids(rows):
+    # Id stable tiré du contenu (titre + médias) : ne bouge pas quand on insère / déplace des lignes.
+    # Titres en double : la première occurrence (ordre du sheet) garde son id, les suivantes prennent la date en plus,
+    # puis un numéro si elle ne suffit pas ; ajouter un doublon ne change donc pas l'id de l'œuvre déjà là
+    ids = [work_id(k, g, m) for k, g, m in zip(rows["unique_key"], rows["global"], rows["media"])]
+    if len(set(ids)) < len(ids):
+        taken, out = set(), []
+        for i, k, g, m, d in zip(ids, rows["unique_key"], rows["global"], rows["media"], rows["date_full"]):
+            if i in taken: i = work_id(k, g, m, d)
+            j, n = i, 1
+            while j in taken:
+                n += 1
+                j = f"{i}-{n}"
+            taken.add(j)
+            out.append(j)
+        ids = out
+    rows["id"] = ids
+    return rows
+
+
+def build_dataset(df):
+    df, c = prepare(df)
+    if not c["nom"]: return Works.empty(), {}, {}, []
+
+    rows = assign_ids(derive_rows(df, c))
+    stats, histo_data, unique_medias = aggregate(rows)
+    return export(rows), stats, histo_data, unique_medias
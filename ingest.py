@@ -0,0 +1,79 @@
+import csv
+import hashlib
+import io
+
+import pandas as pd
+
+from engine import Accumulator, RecordStore, derive_rows, resolve_columns
+
+# LECTURE DU CSV
+# - seulement les colonnes du mapping (usecols résolu par les alias), dtypes explicites :
+#   texte partout (pas de "1984.0" pour un titre numérique), catégories pour Média global / Média / Rank
+# - ingest() : lecture par blocs, chaque bloc est dérivé puis versé dans les compteurs et un magasin de lignes
+#   compact ; la mémoire de pointe reste ~ magasin + un bloc, au lieu de CSV brut + DataFrame + dicts
+
+CHUNK_ROWS = 50_000
+CATEGORY_KEYS = ("glob", "det", "rank")
+
+
+class SourceReader(io.RawIOBase):
+    # Flux d'octets (réponse HTTP, fichier) : sha256 et taille calculés au passage, en-tête lisible avant pandas
+
+    def __init__(self, raw):
+        self.raw, self.buf = raw, b""
+        self.sha, self.size = hashlib.sha256(), 0
+
+    def readable(self):
+        return True
+
+    def pull(self, n):
+        b = self.raw.read(n)
+        self.sha.update(b)
+        self.size += len(b)
+        return b
+
+    def header(self):
+        while b"\n" not in self.buf:
+            b = self.pull(1 << 16)
+            if not b: break
+            self.buf += b
+        line = self.buf.split(b"\n", 1)[0].decode("utf-8-sig").rstrip("\r")
+        return next(csv.reader([line]), [])
+
+    def readinto(self, out):
+        b = self.buf or self.pull(len(out))
+        n = min(len(b), len(out))
+        out[:n], self.buf = b[:n], b[n:]
+        return n
+
+    def hexdigest(self):
+        return self.sha.hexdigest()
+
+
+def csv_options(header):
+    # -> (mapping, options de read_csv) ; mapping["nom"] à None si le sheet n'a pas de colonne Nom
+    names = {h: h.strip() for h in header}
+    c = resolve_columns(names.values())
+    wanted = {c[k]: ("category" if k in CATEGORY_KEYS else str) for k in c if c[k]}
+    usecols = [h for h, n in names.items() if n in wanted]
+    return c, {"usecols": usecols, "dtype": {h: wanted[names[h]] for h in usecols}}
+
+
+def read_frame(src):
+    # CSV entier -> DataFrame réduit aux colonnes utiles
+    c, opts = csv_options(src.header())
+    if not c["nom"]: return pd.DataFrame()
+    return pd.read_csv(io.BufferedReader(src), **opts)
+
+
+def ingest(src, chunksize=CHUNK_ROWS):
+    # -> (RecordStore, Accumulator), ou None sans colonne Nom
+    c, opts = csv_options(src.header())
+    if not c["nom"]: return None
+    store, acc = RecordStore(), Accumulator()
+    for chunk in pd.read_csv(io.BufferedReader(src), chunksize=chunksize, **opts):
+        chunk.columns = [str(x).strip() for x in chunk.columns]
+        rows = derive_rows(chunk, c)
+        acc.add(rows)
+        store.append(rows)
+    return store, acc
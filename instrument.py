@@ -0,0 +1,68 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# INSTRUMENTATION DU PIPELINE (téléchargement -> lecture -> dérivation -> export -> page)
+# Chaque étape est chronométrée et gardée dans un journal borné par process (un perf_counter et un append :
+# négligeable devant les étapes elles-mêmes). Affichage opt-in : panneau avec RETRO_DEBUG=1 ou ?debug=1,
+# et avec RETRO_DEBUG chaque événement est aussi écrit en log JSON (logger "retro"). Les événements en erreur
+# (champ "error") y sont toujours écrits, en warning.
+
+ENABLED = os.environ.get("RETRO_DEBUG", "") not in ("", "0")
+MAX_EVENTS = int(os.environ.get("RETRO_DEBUG_EVENTS", "500"))
+
+log = logging.getLogger("retro")
+if ENABLED and not log.handlers:
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    log.addHandler(handler)
+    log.setLevel(logging.INFO)
+
+events = deque(maxlen=MAX_EVENTS) # append / itération thread-safe (threads de synchro + reruns)
+
+
+def record(name, **fields):
+    event = {"stage": name, "at": round(time.time(), 3), "thread": threading.current_thread().name, **fields}
+    events.append(event)
+    if "error" in event: log.warning(json.dumps(event, ensure_ascii=False, default=str))
+    elif ENABLED: log.info(json.dumps(event, ensure_ascii=False, default=str))
+    return event
+
+
+@contextmanager
+def stage(name, **fields):
+    # with stage("fetch", sheet=s) as ev: ev["bytes"] = n  -> un événement avec la durée (ms) et les champs ajoutés
+    ev, t = dict(fields), time.perf_counter()
+    try: yield ev
+    except Exception as e:
+        ev["error"] = repr(e)
+        raise
+    finally:
+        record(name, ms=round((time.perf_counter() - t) * 1000, 2), **ev)
+
+
+def recent(name=None, limit=50, **match):
+    # Derniers événements (du plus récent au plus ancien), filtrés par étape et par valeurs de champs
+    out = []
+    for ev in reversed(list(events)):
+        if (name is None or ev["stage"] == name) and all(ev.get(k) == v for k, v in match.items()):
+            out.append(ev)
+            if len(out) >= limit: break
+    return out
+
+
+def summary():
+    # Par étape : nombre, dernière durée, moyenne et max (ms)
+    out = {}
+    for ev in list(events):
+        if "ms" not in ev: continue
+        s = out.setdefault(ev["stage"], {"n": 0, "last_ms": 0.0, "mean_ms": 0.0, "max_ms": 0.0})
+        s["n"] += 1
+        s["last_ms"] = ev["ms"]
+        s["mean_ms"] += (ev["ms"] - s["mean_ms"]) / s["n"]
+        s["max_ms"] = max(s["max_ms"], ev["ms"])
+    return {k: {f: round(v, 2) for f, v in s.items()} for k, s in out.items()}
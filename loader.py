@@ -0,0 +1,168 @@
+import multiprocessing
+import os
+import random
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from instrument import record, stage
+from snapshot import SnapshotStore
+from sync import SheetSync, sheet_url
+
+# CHARGEMENT MULTI-SHEETS (une rétrospective par personne, un seul serveur)
+# - téléchargements en parallèle (pool de threads borné, connexions HTTP réutilisées)
+# - dérivation des lignes dans un pool de process partagé
+# - un SheetSync par sheet (= cache du sheet), gardés en LRU sous un plafond mémoire
+# - stale-while-revalidate : un thread de fond par process relit chaque sheet toutes les REFRESH secondes
+#   (backoff avec jitter en cas d'échec) ; les reruns lisent le dernier état complet sans jamais attendre le réseau,
+#   sauf première tentative d'un sheet sans snapshot (jeu vide si elle échoue). Demandes simultanées d'un même sheet = une seule requête.
+
+REFRESH = int(os.environ.get("RETRO_REFRESH", "60"))
+MAX_BACKOFF = int(os.environ.get("RETRO_MAX_BACKOFF", "900"))
+FETCH_WORKERS = int(os.environ.get("RETRO_FETCH_WORKERS", "8"))
+PARSE_WORKERS = int(os.environ.get("RETRO_PARSE_WORKERS", str(min(4, os.cpu_count() or 1))))
+CACHE_MB = int(os.environ.get("RETRO_CACHE_MB", "512"))
+MAX_SHEETS = int(os.environ.get("RETRO_MAX_SHEETS", "64"))
+MAX_REQUEST_SHEETS = int(os.environ.get("RETRO_MAX_REQUEST_SHEETS", "8")) # Sheets nommés par une seule URL (?sheet=)
+SHEET_ID_RE = re.compile(r"[A-Za-z0-9_-]{1,128}") # Un id sert de nom de fichier (snapshot, reviews) et entre dans l'URL d'export
+
+
+def sheet_ids_from(value, limit=None):
+    # "id1, id2" ou ["id1", "id2,id3"] -> ["id1", "id2", "id3"] (ordre gardé, sans doublons) ;
+    # ids invalides ignorés, au plus limit ids
+    if isinstance(value, str): value = [value]
+    ids = [s.strip() for v in value or [] for s in v.split(",")]
+    return list(dict.fromkeys(s for s in ids if SHEET_ID_RE.fullmatch(s)))[:limit]
+
+
+def backoff(failures, interval, cap):
+    # Délai avant nouvel essai : doublé à chaque échec, plafonné, jitter ±50 % pour ne pas relancer tous les sheets ensemble
+    return min(cap, interval * 2 ** (failures - 1)) * random.uniform(0.5, 1.5)
+
+
+class SheetLoader:
+    def __init__(self, refresh=REFRESH, max_backoff=MAX_BACKOFF, fetch_workers=FETCH_WORKERS, parse_workers=PARSE_WORKERS, cache_mb=CACHE_MB, max_sheets=MAX_SHEETS):
+        self.refresh_interval = refresh
+        self.max_backoff = max_backoff
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=fetch_workers, pool_maxsize=fetch_workers)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self.fetch_pool = ThreadPoolExecutor(fetch_workers, thread_name_prefix="sheet-fetch")
+        # spawn : pas de fork d'un process serveur multi-threadé
+        self.parse_pool = ProcessPoolExecutor(parse_workers, mp_context=multiprocessing.get_context("spawn")) if parse_workers > 0 else None
+
+        self.max_bytes = cache_mb * 1024 * 1024
+        self.max_sheets = max_sheets
+        self.syncs = OrderedDict() # sheet_id -> SheetSync, du moins au plus récemment utilisé
+        self.on_evict = [] # Rappels f(sheet_id) après éviction (ce qui garde des données d'un sheet les libère avec lui)
+        self.lock = threading.Lock()
+
+        # Planning du thread de fond (protégé par self.lock)
+        self.due = {} # sheet_id -> time.monotonic() de la prochaine relecture
+        self.failures = {} # sheet_id -> échecs consécutifs
+        self.inflight = {} # sheet_id -> Future de la relecture en cours
+        self.wake = threading.Condition(self.lock)
+        self.refresher = threading.Thread(target=self.run, name="sheet-refresher", daemon=True)
+        self.refresher.start()
+
+    def get(self, sheet_id):
+        if not SHEET_ID_RE.fullmatch(sheet_id): raise ValueError(f"id de sheet invalide : {sheet_id!r}")
+        with self.lock:
+            sync = self.syncs.get(sheet_id)
+            if sync is None:
+                sync = self.syncs[sheet_id] = SheetSync(sheet_url(sheet_id), session=self.session, store=SnapshotStore(sheet_id), executor=self.parse_pool, name=sheet_id)
+                # Relu tout de suite (démarrage à froid : on sert la snapshot en attendant)
+                self.due[sheet_id] = time.monotonic()
+                self.wake.notify()
+            self.syncs.move_to_end(sheet_id)
+            return sync
+
+    def refresh(self, sheet_id):
+        # -> Future de la relecture du sheet ; une seule à la fois par sheet, les demandes simultanées la partagent
+        with self.lock:
+            future = self.inflight.get(sheet_id)
+            sync = self.syncs.get(sheet_id)
+            if future is not None or sync is None: return future
+            future = self.inflight[sheet_id] = self.fetch_pool.submit(sync.sync)
+        # Hors du verrou : un future déjà terminé appelle done() tout de suite, dans ce thread, et done() prend le verrou
+        future.add_done_callback(lambda f: self.done(sheet_id, f))
+        return future
+
+    def done(self, sheet_id, future):
+        # L'erreur elle-même est journalisée par l'étape "sync" (cf. instrument.py) ; ici, le prochain essai
+        error = future.exception()
+        with self.lock:
+            self.inflight.pop(sheet_id, None)
+            if sheet_id not in self.syncs: return # Évincé entre-temps
+            n = self.failures[sheet_id] = self.failures.get(sheet_id, 0) + 1 if error else 0
+            delay = backoff(n, self.refresh_interval, self.max_backoff) if n else self.refresh_interval
+            self.due[sheet_id] = time.monotonic() + delay
+            self.wake.notify()
+            if error: record("retry", sheet=sheet_id, failures=n, delay_s=round(delay, 1))
+
+    def run(self):
+        # Boucle du thread de fond : lance les relectures arrivées à échéance, dort jusqu'à la suivante
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                waiting = {s: t for s, t in self.due.items() if s not in self.inflight}
+                ready = [s for s, t in waiting.items() if t <= now]
+                if not ready:
+                    self.wake.wait(min(waiting.values()) - now if waiting else None)
+                    continue
+            for sheet_id in ready:
+                self.refresh(sheet_id)
+
+    def load(self, sheet_id):
+        # -> (jeu de données, version) : dernier état complet (mémoire ou snapshot) ; n'attend que la première tentative d'un sheet qui n'en a aucun
+        return self.load_many([sheet_id])[sheet_id]
+
+    def load_many(self, sheet_ids):
+        with stage("load", sheets=len(sheet_ids)) as ev:
+            syncs = {s: self.get(s) for s in sheet_ids}
+            # Sheets sans état dont aucune tentative n'a encore abouti : ce rerun attend le réseau (ou la tentative en cours).
+            # Après un échec, jeu vide tout de suite : les nouveaux essais restent au thread de fond (backoff)
+            with self.lock: waiting = [s for s, sync in syncs.items() if sync.latest is None and not self.failures.get(s)]
+            cold = [f for f in map(self.refresh, waiting) if f is not None]
+            ev["cold"] = len(cold)
+            for future in cold:
+                try: future.result()
+                except Exception: pass # Déjà journalisé (étape "sync") ; on sert un jeu vide
+            self.evict(keep=set(sheet_ids))
+            return {s: sync.current() for s, sync in syncs.items()}
+
+    def ages(self):
+        # sheet_id -> secondes depuis la dernière tentative de synchro (None si jamais tentée)
+        now = time.monotonic()
+        with self.lock:
+            return {sheet_id: None if s.checked_at is None else round(now - s.checked_at, 1) for sheet_id, s in self.syncs.items()}
+
+    def footprint(self):
+        with self.lock:
+            return sum(s.footprint() for s in self.syncs.values())
+
+    def evict(self, keep=()):
+        # LRU : on retire les sheets les moins récemment demandés (jamais ceux de la requête en cours)
+        evicted = []
+        with self.lock:
+            total = sum(s.footprint() for s in self.syncs.values())
+            for sheet_id in list(self.syncs):
+                if len(self.syncs) <= self.max_sheets and total <= self.max_bytes: break
+                if sheet_id in keep: continue
+                total -= self.syncs.pop(sheet_id).footprint()
+                self.due.pop(sheet_id, None)
+                self.failures.pop(sheet_id, None)
+                evicted.append(sheet_id)
+        for sheet_id in evicted:
+            for callback in self.on_evict: callback(sheet_id)
+
+    def counters(self):
+        with self.lock:
+            return {sheet_id: dict(s.counters) for sheet_id, s in self.syncs.items()}
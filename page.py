@@ -0,0 +1,828 @@
+import functools
+import json
+import os
+import time
+
+from engine import MOIS_FR, empty_dataset
+from instrument import stage
+from payload import LOCAL_SHEET, STATIC_DIR, chart_cube, facet_index, membership_index, publish_reviews, search_index, split_payload
+
+SHELL_DIR = os.path.join(STATIC_DIR, "component")
+
+# TEMPLATE DE LA PAGE (str.format : accolades CSS/JS doublées)
+HTML_TEMPLATE = """
+<!DOCTYPE html>
+<html>
+<head>
+<link href="https://fonts.googleapis.com/css2?family=Outfit:wght@300;700;900&display=swap" rel="stylesheet">
+<style>
+    :root {{ --bg: #050505; --card: #111; --rose: #F58AFF; --jaune: #F9FCBB; --font: 'Outfit', sans-serif; }}
+    body {{ background: var(--bg); color: white; font-family: var(--font); margin: 0; padding: 0; }}
+    * {{ box-sizing: border-box; }}
+    /* La page défile dans #app : l'iframe d'un composant Streamlit ne défile pas elle-même */
+    html, body {{ height: 100%; overflow: hidden; }}
+    #app {{ height: 100%; overflow-y: auto; }}
+
+    /* NAV */
+    .nav {{ display: flex; justify-content: center; gap: 30px; padding: 25px; background: rgba(5,5,5,0.95); position: sticky; top: 0; z-index: 200; backdrop-filter: blur(10px); }}
+    .nav-btn {{ background: transparent; border: none; color: #888; font-weight: 900; text-transform: uppercase; cursor: pointer; font-size: 0.9rem; letter-spacing: 2px; transition: 0.2s; }}
+    .nav-btn:hover, .nav-btn.active {{ color: white; text-shadow: 0 0 10px var(--rose); transform: scale(1.05); }}
+
+    .page {{ display: none; min-height: 100vh; flex-direction: column; align-items: center; padding-bottom: 60px; width: 100%; }}
+    .active-page {{ display: flex; }}
+
+    /* HUB */
+    .h-stat {{ font-size: 11rem; font-weight: 900; color: var(--rose); line-height: 1; text-shadow: 0 0 40px rgba(245, 138, 255, 0.25); margin: 20px 0; }}
+    .btn-explore {{ margin-top: 30px; padding: 15px 50px; background: transparent; border: 2px solid var(--rose); color: var(--rose); border-radius: 50px; font-weight: 900; font-size: 1.2rem; cursor: pointer; transition: 0.2s; text-transform: uppercase; letter-spacing: 2px; }}
+    .btn-explore:hover {{ background: var(--rose); color: #000; box-shadow: 0 0 25px var(--rose); }}
+
+    /* FILTERS - MULTI SELECTION */
+    .filter-area {{ width: 100%; max-width: 950px; display: flex; flex-direction: column; align-items: center; gap: 12px; margin: 30px 0; }}
+    .search-wrap {{ position: relative; width: 350px; margin-bottom: 10px; }}
+    .search-in {{ width: 100%; background: #111; border: 1px solid #333; color: white; padding: 12px 40px; border-radius: 30px; text-align: center; font-weight: bold; outline: none; text-transform: uppercase; }}
+    .search-in:focus {{ border-color: var(--rose); }}
+    .search-x {{ position: absolute; right: 15px; top: 50%; transform: translateY(-50%); color: #ff5555; cursor: pointer; display: none; font-weight: 900; font-size: 1.2rem; }}
+    
+    .f-row {{ display: flex; flex-wrap: wrap; justify-content: center; gap: 8px; width: 100%; }}
+    .btn-f {{ background: #151515; border: 1px solid #333; color: #777; padding: 6px 14px; border-radius: 20px; cursor: pointer; font-size: 0.75rem; font-weight: 700; transition: 0.2s; text-transform: uppercase; }}
+    .btn-f:hover {{ color: white; border-color: #666; }}
+    .btn-f.active {{ border-color: var(--rose); color: white; background: rgba(245, 138, 255, 0.15); }}
+
+    /* DROPDOWNS */
+    .dd-wrap {{ position: relative; display: inline-block; }}
+    .dd-menu {{ display: none; position: absolute; background: #111; border: 1px solid var(--rose); border-radius: 10px; width: 250px; max-height: 350px; overflow-y: auto; z-index: 1000; top: 110%; left: 50%; transform: translateX(-50%); }}
+    .dd-menu.show {{ display: block; }}
+    .dd-item {{ padding: 10px; color: #aaa; font-size: 0.8rem; border-bottom: 1px solid #222; cursor: pointer; text-align: left; }}
+    .dd-item:hover {{ background: #222; color: white; }}
+    .dd-item.sel {{ color: var(--rose); font-weight: 900; background: rgba(245, 138, 255, 0.1); }}
+    .reset-x {{ color: #ff5555; font-weight: 900; cursor: pointer; margin-left: 8px; vertical-align: middle; }}
+
+    /* TIMELINE */
+    .tl-cont {{ width: 100%; max-width: 800px; position: relative; }}
+    /* Timeline virtualisée : hauteurs fixes (voir ROW_H) pour positionner sans mesurer */
+    .tl-win {{ position: absolute; top: 0; left: 0; right: 0; will-change: transform; }}
+    .tl-win .month-lbl {{ height: 150px; margin: 0; padding-top: 60px; line-height: 1; }}
+    .tl-win .card {{ height: 85px; }}
+    .tl-win .c-tit {{ white-space: nowrap; overflow: hidden; text-overflow: ellipsis; max-width: 600px; }}
+    .tl-sticky {{ position: sticky; top: 75px; z-index: 150; width: 100%; max-width: 800px; text-align: center; font-weight: 900; letter-spacing: 4px; color: var(--jaune); background: rgba(5,5,5,0.9); padding: 8px 0; visibility: hidden; }}
+    .month-lbl {{ font-size: 3.5rem; font-weight: 900; color: transparent; -webkit-text-stroke: 1px var(--jaune); text-align: center; margin: 60px 0 30px 0; clear: both; width: 100%; }}
+    .card {{ background: var(--card); border-left: 5px solid var(--rose); padding: 20px 25px; margin-bottom: 15px; border-radius: 12px; display: flex; justify-content: space-between; align-items: center; cursor: pointer; transition: 0.2s; box-shadow: 0 5px 15px rgba(0,0,0,0.3); }}
+    .card:hover {{ transform: translateX(5px); background: #181818; box-shadow: 0 5px 25px rgba(245, 138, 255, 0.1); }}
+    .c-tit {{ font-size: 1.3rem; font-weight: 700; color: white; margin-bottom: 5px; }}
+    .c-rnk {{ border: 1px solid var(--rose); color: var(--rose); padding: 5px 10px; border-radius: 8px; font-size: 0.8rem; font-weight: 900; text-transform: uppercase; }}
+
+    /* HISTOGRAMMES (VERTICAL NEON STYLE) */
+    .histo-sec {{ width: 100%; max-width: 850px; margin-top: 80px; border-top: 1px dashed #333; padding-top: 40px; }}
+    .chart-box {{ height: 250px; display: flex; align-items: flex-end; justify-content: center; gap: 15px; margin-bottom: 50px; }}
+    /* New styling to match horizontal bars but vertical */
+    .c-col {{ flex: 1; background: rgba(255,255,255,0.05); border-radius: 10px; position: relative; display: flex; flex-direction: column-reverse; cursor: pointer; transition: 0.2s; overflow: hidden; }}
+    .c-col:hover {{ filter: brightness(1.3); transform: scaleY(1.02); }}
+    .c-seg {{ width: 100%; transition: 0.2s; }} 
+    .c-val {{ position: absolute; top: -30px; left: 50%; transform: translateX(-50%); font-size: 0.9rem; color: var(--rose); font-weight: 900; }}
+    .c-lbl {{ position: absolute; bottom: -35px; left: 50%; transform: translateX(-50%) rotate(-45deg); font-size: 0.7rem; color: #888; white-space: nowrap; font-weight: 700; }}
+
+    /* HORIZONTAL CHART */
+    .h-row {{ display: flex; align-items: center; margin-bottom: 12px; cursor: pointer; height: 28px; }}
+    .h-txt {{ width: 140px; text-align: right; font-size: 0.8rem; color: #ccc; margin-right: 15px; font-weight: 700; white-space: nowrap; overflow: hidden; text-overflow: ellipsis; }}
+    .h-tr {{ flex: 1; height: 100%; background: rgba(255,255,255,0.05); border-radius: 10px; overflow: hidden; position: relative; display: flex; }}
+    .h-seg {{ height: 100%; transition: 0.2s; position: relative; border-radius: 0 10px 10px 0; }}
+    .h-num {{ width: 35px; text-align: left; font-size: 0.9rem; color: var(--rose); font-weight: 900; margin-left: 10px; }}
+
+    /* GRIDS */
+    .grid {{ display: grid; grid-template-columns: repeat(auto-fill, minmax(200px, 1fr)); gap: 20px; width: 100%; max-width: 1000px; padding: 20px; }}
+    .w-item {{ background: #111; border: 1px solid #333; padding: 30px; border-radius: 20px; text-align: center; cursor: pointer; transition: 0.3s; }}
+    .w-item:hover {{ border-color: var(--rose); transform: translateY(-10px); }}
+    .w-num {{ font-size: 4rem; font-weight: 900; color: var(--rose); line-height: 1; }}
+    .w-lbl {{ color: var(--jaune); font-weight: 700; text-transform: uppercase; margin-top: 10px; letter-spacing: 1px; }}
+
+    /* WORK PAGE */
+    .w-rev {{ background: #fff; color: #000; padding: 30px; border-radius: 15px; margin: 30px 0; line-height: 1.6; font-size: 1.1rem; font-weight: 500; display: block; }}
+    .tag {{ display: inline-block; padding: 6px 15px; border: 1px solid #333; border-radius: 20px; margin: 4px; font-size: 0.8rem; cursor: pointer; color: #aaa; }}
+    .tag:hover {{ border-color: white; color: white; }}
+    .alink {{ color: var(--rose); font-weight: 900; text-decoration: underline; cursor: pointer; }}
+    
+    /* DETAIL PAGE */
+    .d-head {{ font-size: 3rem; font-weight: 900; color: var(--rose); text-transform: uppercase; margin-bottom: 20px; text-align: center; }}
+</style>
+</head>
+<body>
+<div id="app">
+
+    <div class="nav">
+        <button class="nav-btn active" onclick="nav('hub')">HOME</button>
+        <button class="nav-btn" onclick="nav('timeline')">DATABASE</button>
+        <button class="nav-btn" onclick="nav('media')">MÉDIAS</button>
+        <button class="nav-btn" onclick="nav('rank')">CLASSEMENT</button>
+        <button class="nav-btn" onclick="nav('mood')">MOODS</button>
+    </div>
+
+    <div id="hub" class="page active-page" style="justify-content:center;">
+        <div style="letter-spacing:12px; color:var(--jaune); font-weight:900;">RÉTROSPECTIVE</div>
+        <div class="h-stat" id="hub-count">0</div>
+        <div style="letter-spacing:6px; color:#555; font-weight:900; margin-bottom:50px;">ŒUVRES TERMINÉES</div>
+        <button class="btn-explore" onclick="nav('timeline')">EXPLORER LA DATABASE</button>
+    </div>
+
+    <div id="timeline" class="page">
+        <div class="filter-area">
+            <div class="search-wrap">
+                <input type="text" id="search" class="search-in" placeholder="RECHERCHER..." oninput="handleSearch()">
+                <span id="search-x" class="search-x" onclick="clearSearch()">✕</span>
+            </div>
+            <div id="row-glob" class="f-row"></div>
+            <div id="row-med" class="f-row" style="display:none;"></div>
+            <div id="row-rnk" class="f-row"></div>
+            <div class="f-row" style="margin-top:10px;">
+                <div id="dd-genre"></div>
+                <div id="dd-tag"></div>
+            </div>
+        </div>
+
+        <div id="tl-sticky" class="tl-sticky"></div>
+        <div id="tl-cont" class="tl-cont"></div>
+
+        <div class="histo-sec">
+            <div style="color:var(--jaune); font-weight:900; margin-bottom:20px; border-left:4px solid var(--rose); padding-left:10px;">VOLUME MENSUEL</div>
+            <div id="chart-vol" class="chart-box"></div>
+            <div style="color:var(--jaune); font-weight:900; margin:40px 0 20px 0; border-left:4px solid var(--rose); padding-left:10px;">TOP GENRES</div>
+            <div id="chart-mood" style="width:100%;"></div>
+        </div>
+    </div>
+
+    <div id="media" class="page"><h1 style="color:var(--rose)">MÉDIAS WALL</h1><div id="wall-media" class="grid"></div></div>
+    <div id="rank" class="page"><h1 style="color:var(--rose)">CLASSEMENT</h1><div id="wall-rank" class="grid"></div></div>
+    <div id="mood" class="page"><h1 style="color:var(--rose)">MOODS</h1><div id="wall-mood" class="grid"></div></div>
+    
+    <div id="work" class="page"></div>
+    <div id="detail" class="page"></div>
+</div>
+
+    <script>
+        const T_START = performance.now(); // Chargement de l'iframe + lecture du script
+        const MOIS = {mois};
+        const CHANNEL = {channel}; // Servie comme composant : les données arrivent par messages (cf. channel.py)
+        let DEBUG = {debug};
+        const COLORS = {{"Jeu vidéo": "#29B6F6", "Livre": "#66BB6A", "Film": "#EF5350", "Série": "#AB47BC", "Manga": "#FDD835", "Anime": "#FFA726", "Autre": "#555"}};
+        const RANK_ORDER = ["Parfait", "Coup de cœur", "Cool +", "Cool", "Sympa +", "Sympa", "Sans Rank"];
+
+        // ETAT (SETS POUR MULTI-SELECTION)
+        let activeGlobal = new Set(["All"]); 
+        let activeMedia = new Set(["All"]);
+        let activeRank = new Set(["All"]);
+        let activeGenres = new Set(), activeTags = new Set(), activeSearch = "";
+
+        // DONNÉES D'UNE VERSION (remplacées en bloc par loadPayload). SORTED : genres / tags déjà triés (ordre de Array.sort) pour les menus
+        let INDEX, STATS, GLOBALS, MEDIAS, SEARCH, MEMBERS, CUBE, REVIEWS_URL, SORTED;
+        let FACETS, MONTHS, DATA, BY_ID, T_INIT;
+
+        // INIT : l'index arrive encodé par dictionnaire (codes -> INDEX.v) ; on reconstruit les œuvres
+        // (libellés de mois et dates recalculés ici) et les index inversés des facettes en une passe
+        function loadPayload(P) {{
+            ({{ INDEX, STATS, GLOBALS, MEDIAS, SEARCH, CUBE, SORTED }} = P);
+            // Composant : chemins relatifs à l'app Streamlit, pas à l'iframe
+            REVIEWS_URL = CHANNEL && P.REVIEWS_URL ? new URL(P.REVIEWS_URL, STREAMLIT_URL).href : P.REVIEWS_URL;
+            FACETS = {{ global: {{}}, media: {{}}, rank: {{}}, genre: {{}}, tag: {{}} }};
+            MONTHS = INDEX.v.month.map(s => {{
+                const ok = s < 999999, mm = String(s % 100).padStart(2, '0');
+                return {{ sort_key: s, ok, mm, y: Math.floor(s / 100), label: ok ? `${{MOIS[s % 100 - 1]}} ${{Math.floor(s / 100)}}` : "INCONNU" }};
+            }});
+            DATA = decode();
+            MEMBERS = P.MEMBERS || membersFrom(FACETS);
+            BY_ID = new Map(DATA.map((d, i) => [d.id, i]));
+            WORDS = (DATA.length + 31) >>> 5;
+            FACET_BITS = {{ global: {{}}, media: {{}}, rank: {{}}, genre: {{}}, tag: {{}} }};
+            FILTER = null; SEARCH_MEMO = {{ q: null, bits: null }}; REVIEW_PAGES = {{}};
+            document.getElementById('hub-count').innerText = DATA.length;
+        }}
+        function decode() {{
+            const V = INDEX.v, months = MONTHS, out = new Array(INDEX.id.length);
+            const add = (type, val, i) => (FACETS[type][val] || (FACETS[type][val] = [])).push(i);
+            const next = {{ genres: 0, tags: 0 }}; // Curseur dans les codes à plat de chaque champ multiple
+            const multi = (field, vocab, type, i) => {{
+                const [counts, codes] = INDEX[field], vals = [];
+                for(let n = counts[i]; n > 0; n--) {{ const v = vocab[codes[next[field]++]]; vals.push(v); add(type, v, i); }}
+                return vals;
+            }};
+            for(let i = 0; i < out.length; i++) {{
+                const m = months[INDEX.month[i]], dd = String(INDEX.day[i]).padStart(2, '0');
+                const d = out[i] = {{
+                    id: INDEX.id[i], nom: INDEX.nom[i],
+                    global: V.media[INDEX.global[i]], media: V.media[INDEX.media[i]], rank: V.rank[INDEX.rank[i]],
+                    genres: multi('genres', V.genre, 'genre', i), tags: multi('tags', V.tag, 'tag', i),
+                    sort_key: m.sort_key, mois_display: m.label,
+                    date_aff: m.ok ? `${{dd}}/${{m.mm}}` : "?", date_full: m.ok ? `${{dd}}/${{m.mm}}/${{m.y}}` : "?",
+                }};
+                if(INDEX.rp[i] >= 0) d.rp = INDEX.rp[i];
+                add('global', d.global, i); add('media', d.media, i); add('rank', d.rank, i);
+            }}
+            return out;
+        }}
+        function membersFrom(F) {{
+            // Même règle que membership_index (payload.py) : valeurs présentes des deux côtés -> union triée
+            const out = {{ media: {{}}, mood: {{}} }};
+            for(const [kind, a, b] of [['media', 'global', 'media'], ['mood', 'genre', 'tag']])
+                for(const v in F[a]) if(v in F[b]) out[kind][v] = [...new Set([...F[a][v], ...F[b][v]])].sort((x, y) => x - y);
+            return out;
+        }}
+
+        const SCROLLER = document.getElementById('app');
+        function nav(id) {{
+            document.querySelectorAll('.page').forEach(p => p.classList.remove('active-page'));
+            document.getElementById(id).classList.add('active-page');
+            SCROLLER.scrollTo(0,0);
+            
+            document.querySelectorAll('.nav-btn').forEach(b => b.classList.remove('active'));
+            [...document.querySelectorAll('.nav-btn')].forEach(b => {{
+                if(b.innerText.toLowerCase().includes(id)) b.classList.add('active');
+            }});
+            renderPage(id);
+        }}
+        function renderPage(id) {{
+            // Murs : comptes restreints aux filtres de la database (cf. chartStats)
+            if(id === 'timeline') updateFilters();
+            if(id === 'media') renderWall('wall-media', chartStats().media, 'media');
+            if(id === 'rank') renderWall('wall-rank', chartStats().rank, 'rank');
+            if(id === 'mood') {{ const s = chartStats(); renderWall('wall-mood', {{...s.genre, ...s.tag}}, 'mood'); }}
+        }}
+
+        // RENDU PROGRESSIF : boutons et premier écran de la timeline tout de suite, le reste (suite de la timeline,
+        // menus, graphiques) par tranches en temps libre ; un nouveau rendu annule les tranches de l'ancien
+        let RENDER_GEN = 0;
+        const idle = window.requestIdleCallback || (cb => setTimeout(() => cb({{ timeRemaining: () => 8 }}), 0));
+        function later(gen, fn) {{ idle(deadline => {{ if(gen === RENDER_GEN) fn(deadline); }}); }}
+
+        function updateFilters() {{
+            const gen = ++RENDER_GEN;
+            FILTER = computeFilter();
+            renderRow('row-glob', ['All', ...GLOBALS], activeGlobal, 'global');
+            
+            // Logique d'affichage Sous-Média
+            let singleGlobal = (activeGlobal.size === 1 && !activeGlobal.has('All')) ? [...activeGlobal][0] : null;
+            if(singleGlobal) {{
+                const subs = MEDIAS.filter(m => m.global === singleGlobal && m.media !== singleGlobal).map(m => m.media);
+                if(subs.length > 0) {{
+                    document.getElementById('row-med').style.display = 'flex';
+                    renderRow('row-med', ['All', ...subs], activeMedia, 'media');
+                }} else document.getElementById('row-med').style.display = 'none';
+            }} else document.getElementById('row-med').style.display = 'none';
+
+            renderRow('row-rnk', ['All', ...RANK_ORDER], activeRank, 'rank');
+            renderTimeline(gen);
+            later(gen, () => {{ renderDD('dd-genre', 'GENRES', activeGenres, SORTED.genre); renderDD('dd-tag', 'TAGS', activeTags, SORTED.tag); }});
+            later(gen, () => renderHisto());
+        }}
+
+        // BOUTONS FILTRES (MULTI-SELECT)
+        function renderRow(id, items, activeSet, type) {{
+            const el = document.getElementById(id);
+            el.innerHTML = items.map(i => {{
+                let c = getCount(type, i);
+                let isActive = activeSet.has(i);
+                if (c === 0 && i !== 'All' && !isActive) return '';
+                return `<button class="btn-f ${{isActive?'active':''}}" onclick="toggleF('${{type}}', '${{i.replace(/'/g, "\\\\'") }}')">${{i}} (${{c}})</button>`;
+            }}).join('');
+        }}
+
+        // Compte à facettes : œuvres qui passent tous les AUTRES filtres et ont cette valeur
+        function getCount(type, val) {{
+            const base = FILTER.except(type);
+            return val === 'All' ? popcount(base) : popcount(base, facetBits(type, val));
+        }}
+
+        function toggleF(type, val) {{
+            let set;
+            if(type === 'global') set = activeGlobal;
+            if(type === 'media') set = activeMedia;
+            if(type === 'rank') set = activeRank;
+
+            if(val === 'All') {{ set.clear(); set.add('All'); }}
+            else {{
+                if(set.has('All')) set.clear();
+                if(set.has(val)) set.delete(val); else set.add(val);
+                if(set.size === 0) set.add('All');
+            }}
+            updateFilters();
+        }}
+
+        function renderDD(id, lbl, set, keys) {{
+            const el = document.getElementById(id);
+            el.innerHTML = `<div class="dd-wrap">
+                <button class="btn-f ${{set.size > 0 ? 'active' : ''}}" onclick="this.nextElementSibling.classList.toggle('show')">${{lbl}} ${{set.size > 0 ? '('+set.size+')' : ''}}</button>
+                <div class="dd-menu">${{keys.map(k => `<div class="dd-item ${{set.has(k) ? 'sel' : ''}}" onclick="toggleGT('${{lbl}}', '${{k.replace(/'/g, "\\\\'")}}')">${{k}}</div>`).join('')}}</div>
+            </div>${{set.size > 0 ? `<span class="reset-x" onclick="clearGT('${{lbl}}')">✕</span>` : ''}}`;
+        }}
+
+        function toggleGT(type, val) {{ (type === 'GENRES' ? activeGenres : activeTags).has(val) ? (type === 'GENRES' ? activeGenres : activeTags).delete(val) : (type === 'GENRES' ? activeGenres : activeTags).add(val); updateFilters(); }}
+        function clearGT(type) {{ (type === 'GENRES' ? activeGenres : activeTags).clear(); updateFilters(); }}
+
+        // INDEX INVERSÉS -> BITSETS : une valeur de facette = un bit par œuvre (position dans DATA)
+        let WORDS, FACET_BITS, FILTER = null;
+
+        function toBits(ids) {{
+            const b = new Uint32Array(WORDS);
+            for(const i of ids) b[i >>> 5] |= 1 << (i & 31);
+            return b;
+        }}
+        function facetBits(type, val) {{
+            // Converti au premier usage puis gardé
+            const memo = FACET_BITS[type];
+            if(!(val in memo)) memo[val] = toBits((FACETS[type] || {{}})[val] || []);
+            return memo[val];
+        }}
+        function allBits() {{
+            const b = new Uint32Array(WORDS).fill(0xFFFFFFFF);
+            if(DATA.length & 31) b[WORDS - 1] = (1 << (DATA.length & 31)) - 1;
+            return b;
+        }}
+        function unionBits(type, vals) {{
+            const b = new Uint32Array(WORDS);
+            vals.forEach(v => {{ const f = facetBits(type, v); for(let w = 0; w < WORDS; w++) b[w] |= f[w]; }});
+            return b;
+        }}
+        function popcount(a, b) {{
+            let n = 0;
+            for(let w = 0; w < WORDS; w++) {{
+                let x = b ? (a[w] & b[w]) : a[w];
+                x -= (x >>> 1) & 0x55555555;
+                x = (x & 0x33333333) + ((x >>> 2) & 0x33333333);
+                n += (((x + (x >>> 4)) & 0x0F0F0F0F) * 0x01010101) >>> 24;
+            }}
+            return n;
+        }}
+        function forEachBit(b, fn) {{
+            for(let w = 0; w < WORDS; w++) {{
+                let x = b[w];
+                while(x) {{ const t = x & -x; fn((w << 5) + 31 - Math.clz32(t)); x ^= t; }}
+            }}
+        }}
+        // RECHERCHE : chaque mot tapé = préfixe d'un token de SEARCH.v (suffixes des mots des titres, cf. search_index), ET entre les mots
+        function fold(s) {{
+            return s.toLowerCase().replace(/œ/g, 'oe').replace(/æ/g, 'ae').replace(/ß/g, 'ss').normalize('NFKD').replace(/\\p{{M}}/gu, '');
+        }}
+        function lowerBound(arr, x) {{
+            let lo = 0, hi = arr.length;
+            while(lo < hi) {{ const mid = (lo + hi) >> 1; if(arr[mid] < x) lo = mid + 1; else hi = mid; }}
+            return lo;
+        }}
+        let SEARCH_MEMO = {{ q: null, bits: null }};
+        function searchBits(q) {{
+            if(SEARCH_MEMO.q === q) return SEARCH_MEMO.bits;
+            const words = fold(q).split(/[^\\p{{L}}\\p{{N}}]+/u).filter(Boolean);
+            let bits = null;
+            for(const w of words) {{
+                const b = new Uint32Array(WORDS);
+                const end = lowerBound(SEARCH.v, w + '\\uffff');
+                for(let k = lowerBound(SEARCH.v, w); k < end; k++) {{ let i = 0; for(const g of SEARCH.p[k]) {{ i += g; b[i >>> 5] |= 1 << (i & 31); }} }}
+                if(bits) for(let x = 0; x < WORDS; x++) bits[x] &= b[x]; else bits = b;
+            }}
+            SEARCH_MEMO = {{ q, bits }};
+            return bits;
+        }}
+
+        function computeFilter() {{
+            // Une contrainte (OU des valeurs choisies) par dimension, null = pas de filtre ; ET entre dimensions
+            const cons = {{
+                global: activeGlobal.has('All') ? null : unionBits('global', activeGlobal),
+                media: activeMedia.has('All') ? null : unionBits('media', activeMedia),
+                rank: activeRank.has('All') ? null : unionBits('rank', activeRank),
+                genre: activeGenres.size ? unionBits('genre', activeGenres) : null,
+                tag: activeTags.size ? unionBits('tag', activeTags) : null,
+                search: activeSearch ? searchBits(activeSearch) : null,
+            }};
+            const memo = {{}};
+            const and = (skip) => {{
+                const b = allBits();
+                for(const k in cons) if(k !== skip && cons[k]) for(let w = 0; w < WORDS; w++) b[w] &= cons[k][w];
+                return b;
+            }};
+            return {{ final: and(null), except: (type) => memo[type] || (memo[type] = and(type)) }};
+        }}
+        function currentFilter() {{
+            // Murs / pages détail ouverts avant la database : FILTER pas encore calculé
+            return FILTER || (FILTER = computeFilter());
+        }}
+
+        // TIMELINE VIRTUALISÉE : seules les lignes proches de l'écran existent dans le DOM
+        const ROW_H = {{ month: 150, card: 100 }}; // = hauteurs CSS .tl-win (marges comprises)
+        const OVERSCAN = 600;
+        const TL_CHUNK = 2000; // Œuvres placées par tranche en temps libre
+        let TL = {{ items: [], offs: [0], start: -1, end: -1, raf: 0 }};
+
+        function renderTimeline(gen = RENDER_GEN) {{
+            const cont = document.getElementById('tl-cont');
+            const ids = [];
+            forEachBit(FILTER.final, i => ids.push(i));
+            TL = {{ items: [], offs: [0], start: -1, end: -1, raf: 0, ids, done: 0, lastM: "" }};
+
+            if(ids.length === 0) {{
+                cont.style.height = "";
+                cont.innerHTML = "<div style='color:#666; text-align:center; margin-top:50px;'>Aucun résultat</div>";
+                document.getElementById('tl-sticky').style.visibility = 'hidden';
+                return;
+            }}
+            // Premier écran (jusqu'au bas de la fenêtre) tout de suite, la suite par tranches
+            const bottom = Math.max(0, -cont.getBoundingClientRect().top) + window.innerHeight + OVERSCAN;
+            extendTimeline(Math.ceil(bottom / ROW_H.card));
+            drawTimeline();
+            const step = () => later(gen, deadline => {{
+                do extendTimeline(TL_CHUNK); while(TL.done < ids.length && deadline.timeRemaining() > 4);
+                drawTimeline(); // Ne redessine que si la fenêtre visible atteint les nouvelles lignes
+                if(TL.done < ids.length) step();
+            }});
+            if(TL.done < ids.length) step();
+        }}
+
+        function extendTimeline(n) {{
+            // Ajoute n œuvres (en-têtes de mois compris) : offs[k] = haut de la ligne k, dernier élément = hauteur totale
+            const {{ items, offs, ids }} = TL, stop = Math.min(ids.length, TL.done + n);
+            let y = offs[offs.length - 1];
+            for(; TL.done < stop; TL.done++) {{
+                const d = DATA[ids[TL.done]];
+                if(d.mois_display !== TL.lastM) {{ items.push({{ month: d.mois_display }}); offs.push(y += ROW_H.month); TL.lastM = d.mois_display; }}
+                items.push(d); offs.push(y += ROW_H.card);
+            }}
+            document.getElementById('tl-cont').style.height = y + "px";
+        }}
+
+        function firstAfter(offs, y) {{
+            // Première ligne dont le bas dépasse y (recherche dichotomique)
+            let lo = 0, hi = offs.length - 1;
+            while(lo < hi) {{ const mid = (lo + hi) >> 1; if(offs[mid + 1] > y) hi = mid; else lo = mid + 1; }}
+            return lo;
+        }}
+
+        function itemHtml(d) {{
+            if(d.month) return `<div class="month-lbl">${{d.month}}</div>`;
+            return `<div class="card" onclick="goToWork('${{d.id}}')">
+                        <div><div class="c-tit">${{d.nom}}</div><div style="color:#888; font-size:0.8rem; font-weight:700;">${{d.date_aff}}</div></div>
+                        <div class="c-rnk">${{d.rank}}</div>
+                    </div>`;
+        }}
+
+        function drawTimeline() {{
+            const {{ items, offs }} = TL;
+            if(items.length === 0) return;
+            const cont = document.getElementById('tl-cont');
+            const top = -cont.getBoundingClientRect().top;
+            const start = firstAfter(offs, Math.max(0, top - OVERSCAN));
+            const end = Math.min(items.length, firstAfter(offs, top + window.innerHeight + OVERSCAN) + 1);
+
+            if(start !== TL.start || end !== TL.end) {{
+                TL.start = start; TL.end = end;
+                cont.innerHTML = `<div class="tl-win" style="transform:translateY(${{offs[start]}}px)">${{items.slice(start, end).map(itemHtml).join('')}}</div>`;
+            }}
+
+            // En-tête collant : mois de la première ligne visible
+            const sticky = document.getElementById('tl-sticky');
+            if(top > 0 && top < offs[offs.length - 1]) {{
+                let i = firstAfter(offs, top);
+                while(i > 0 && !items[i].month) i--;
+                sticky.innerText = items[i].month;
+                sticky.style.visibility = 'visible';
+            }} else sticky.style.visibility = 'hidden';
+        }}
+
+        function onTimelineScroll() {{
+            if(TL.raf || !document.getElementById('timeline').classList.contains('active-page')) return;
+            TL.raf = requestAnimationFrame(() => {{ TL.raf = 0; drawTimeline(); }});
+        }}
+        SCROLLER.addEventListener('scroll', onTimelineScroll, {{ passive: true }});
+        window.addEventListener('resize', onTimelineScroll);
+
+        // COMPTES FILTRÉS (même forme que STATS / HISTO) : cellules du CUBE retenues par les filtres global / média / rank ;
+        // genres, tags et recherche portent sur les œuvres elles-mêmes, on compte alors directement les œuvres retenues
+        function chartStats() {{
+            const V = INDEX.v, out = {{ histo: {{}}, media: {{}}, rank: {{}}, genre: {{}}, tag: {{}} }};
+            const bump = (o, k, n) => {{ o[k] = (o[k] || 0) + n; }};
+            const tally = (m, g, d, r, n) => {{
+                const gl = V.media[g], mo = MONTHS[m];
+                bump(out.media, gl, n);
+                if(d !== g) bump(out.media, V.media[d], n);
+                bump(out.rank, V.rank[r], n);
+                if(mo.ok) {{
+                    const h = out.histo[mo.sort_key] || (out.histo[mo.sort_key] = {{ label: mo.label, total: 0, sort: mo.sort_key, breakdown: {{}} }});
+                    h.total += n;
+                    bump(h.breakdown, gl, n);
+                }}
+            }};
+            if(activeGenres.size || activeTags.size || activeSearch) {{
+                forEachBit(currentFilter().final, i => {{
+                    tally(INDEX.month[i], INDEX.global[i], INDEX.media[i], INDEX.rank[i], 1);
+                    DATA[i].genres.forEach(x => bump(out.genre, x, 1));
+                    DATA[i].tags.forEach(x => bump(out.tag, x, 1));
+                }});
+            }} else {{
+                const ok = (set, v) => set.has('All') || set.has(v);
+                const keep = CUBE.n.map((n, c) => ok(activeGlobal, V.media[CUBE.g[c]]) && ok(activeMedia, V.media[CUBE.d[c]]) && ok(activeRank, V.rank[CUBE.r[c]]));
+                keep.forEach((k, c) => {{ if(k) tally(CUBE.m[c], CUBE.g[c], CUBE.d[c], CUBE.r[c], CUBE.n[c]); }});
+                for(const [type, vocab] of [['genre', V.genre], ['tag', V.tag]]) {{
+                    const [sizes, codes, counts] = CUBE[type];
+                    let k = 0;
+                    sizes.forEach((size, c) => {{
+                        if(keep[c]) for(let e = k; e < k + size; e++) bump(out[type], vocab[codes[e]], counts[e]);
+                        k += size;
+                    }});
+                }}
+            }}
+            // Ranks dans l'ordre de RANK_ORDER, comme STATS.rank
+            const ranks = {{}};
+            [...RANK_ORDER, ...Object.keys(out.rank)].forEach(r => {{ if(out.rank[r]) ranks[r] = out.rank[r]; }});
+            out.rank = ranks;
+            return out;
+        }}
+
+        // GRAPHIQUES : chaque bloc est construit en une chaîne puis injecté une seule fois
+        function renderHisto() {{
+            const stats = chartStats();
+            const hData = Object.values(stats.histo).sort((a,b) => a.sort - b.sort);
+            const max = Math.max(1, ...hData.map(h => h.total));
+            document.getElementById('chart-vol').innerHTML = hData.map(h => {{
+                let segs = Object.entries(h.breakdown).map(([m, c]) => {{
+                    let col = COLORS[m] || '#555';
+                    // Nouvelle CSS style "Neon"
+                    return `<div class="c-seg" style="height:${{(c/h.total)*100}}%; background:${{col}}; border-radius:10px;"></div>`;
+                }}).join('');
+                return `<div class="c-col" style="height:${{(h.total/max)*100}}%">${{segs}}<div class="c-lbl">${{h.label}}</div><div class="c-val">${{h.total}}</div></div>`;
+            }}).join('');
+
+            const top = Object.entries(stats.genre).sort((a,b)=>b[1]-a[1]).slice(0, 10);
+            const topMax = top.length ? top[0][1] : 1;
+            document.getElementById('chart-mood').innerHTML = top.map(([k,v]) => `<div class="h-row" onclick="forceFilter('genre','${{k.replace(/'/g, "\\\\'")}}')">
+                    <div class="h-txt">${{k}}</div>
+                    <div class="h-tr"><div class="h-seg" style="width:${{(v/topMax)*100}}%; background:var(--rose);"></div></div>
+                    <div class="h-num">${{v}}</div>
+                </div>`).join('');
+        }}
+
+        function forceFilter(type, val) {{
+            activeGenres.clear(); activeTags.clear(); activeGlobal=new Set(["All"]); activeRank=new Set(["All"]);
+            if(type==='genre') activeGenres.add(val); else activeTags.add(val);
+            nav('timeline');
+        }}
+
+        function renderWall(id, obj, type) {{
+            document.getElementById(id).innerHTML = Object.entries(obj).sort((a,b)=>b[1]-a[1]).map(([k,v]) => `
+                <div class="w-item" onclick="showDetailPage('${{type}}', '${{k.replace(/'/g, "\\\\'")}}')">
+                    <div class="w-num">${{v}}</div><div class="w-lbl">${{k}}</div>
+                </div>`).join('');
+        }}
+
+        // PAGE DÉTAIL DÉDIÉE (NOUVEAU)
+        function members(type, val) {{
+            // Positions dans DATA : MEMBERS (unions, précalculées côté Python), sinon FACETS
+            if(type === 'rank') return FACETS.rank[val] || [];
+            const [a, b] = type === 'media' ? ['global', 'media'] : ['genre', 'tag'];
+            return MEMBERS[type][val] || FACETS[a][val] || FACETS[b][val] || [];
+        }}
+
+        function showDetailPage(type, val) {{
+            // Restreint aux filtres de la database, comme les comptes des murs
+            const b = currentFilter().final;
+            const subset = members(type, val).filter(i => (b[i >>> 5] >>> (i & 31)) & 1).map(i => DATA[i]);
+            
+            document.getElementById('detail').innerHTML = `
+                <div class="w-view">
+                    <button class="nav-btn" onclick="nav('${{type === 'mood' ? 'mood' : (type === 'rank' ? 'rank' : 'media')}}')" style="margin-bottom:30px;">RETOUR</button>
+                    <div class="d-head">${{val}} <span style="font-size:1.5rem; color:#666;">(${{subset.length}})</span></div>
+                    <div id="sub-wall" class="grid" style="padding:0; margin-bottom:40px;"></div>
+                    ${{subset.map(d => `<div class="card" onclick="goToWork('${{d.id}}')"><div><div class="c-tit">${{d.nom}}</div><div style="color:#888;">${{d.date_aff}}</div></div><div class="c-rnk">${{d.rank}}</div></div>`).join('')}}
+                </div>`;
+            nav('detail');
+        }}
+
+        // REVIEWS : une page JSON par lot d'œuvres, chargée au premier besoin puis gardée
+        let REVIEW_PAGES = {{}};
+        function loadReview(d) {{
+            if(!(d.rp in REVIEW_PAGES)) REVIEW_PAGES[d.rp] = fetch(`${{REVIEWS_URL}}/${{d.rp}}.json`).then(r => r.json()).catch(() => {{ delete REVIEW_PAGES[d.rp]; return {{}}; }});
+            return REVIEW_PAGES[d.rp].then(p => p[d.id] || "");
+        }}
+
+        function goToWork(id) {{
+            const d = DATA[BY_ID.get(id)];
+            if(!d) return;
+            let rev = (d.rp !== undefined) ? `<div class="w-rev" id="w-rev">...</div>` : "";
+            
+            document.getElementById('work').innerHTML = `
+                <div class="w-view">
+                    <button class="nav-btn" onclick="nav('timeline')" style="margin-bottom:40px;">RETOUR DATABASE</button>
+                    <div class="w-head">${{d.nom}}</div>
+                    <div class="w-meta">${{d.date_full}} • ${{d.rank}}</div>
+                    ${{rev}}
+                    <div style="margin-top:30px;">
+                        ${{d.genres.map(g=>`<span class="tag" onclick="forceFilter('genre','${{g}}')">${{g}}</span>`).join('')}} ${{d.tags.map(t=>`<span class="tag" style="color:var(--rose); border-color:var(--rose);" onclick="forceFilter('tag','${{t}}')">${{t}}</span>`).join('')}}
+                    </div>
+                </div>`;
+            nav('work');
+            if(rev) loadReview(d).then(r => {{
+                const el = document.getElementById('w-rev');
+                if(!el) return;
+                if(r) el.innerHTML = r; else el.remove();
+            }});
+        }}
+
+        // Saisie : on attend une courte pause avant de filtrer (pas un rendu par touche)
+        const SEARCH_DEBOUNCE_MS = 150;
+        let searchTimer = 0;
+        function handleSearch() {{
+            document.getElementById('search-x').style.display = document.getElementById('search').value ? 'block' : 'none';
+            clearTimeout(searchTimer);
+            searchTimer = setTimeout(applySearch, SEARCH_DEBOUNCE_MS);
+        }}
+        function applySearch() {{
+            const q = document.getElementById('search').value.trim();
+            if(q === activeSearch) return;
+            activeSearch = q;
+            updateFilters();
+        }}
+        function clearSearch() {{
+            document.getElementById('search').value = "";
+            document.getElementById('search-x').style.display = 'none';
+            clearTimeout(searchTimer);
+            applySearch();
+        }}
+
+        // DIAGNOSTIC (RETRO_DEBUG / ?debug=1) : durées des rendus, panneau repliable + une ligne JSON par mesure en console
+        const TIMINGS = {{}};
+        function note(name, ms, extra) {{
+            const s = TIMINGS[name] || (TIMINGS[name] = {{ n: 0, last: 0, total: 0, max: 0 }});
+            s.n++; s.last = ms; s.total += ms; s.max = Math.max(s.max, ms);
+            console.log(JSON.stringify({{ stage: name, ms: Math.round(ms * 100) / 100, ...extra }}));
+            const body = document.getElementById('debug-body');
+            if(body) body.innerHTML = Object.entries(TIMINGS).map(([k, t]) =>
+                `<tr><td>${{k}}</td><td>${{t.n}}</td><td>${{t.last.toFixed(1)}}</td><td>${{(t.total / t.n).toFixed(1)}}</td><td>${{t.max.toFixed(1)}}</td></tr>`).join('');
+        }}
+        function timed(name, fn, extra) {{
+            return function(...args) {{
+                const t = performance.now();
+                try {{ return fn.apply(this, args); }} finally {{ note(name, performance.now() - t, extra()); }}
+            }};
+        }}
+        function enableDebug() {{
+            document.body.insertAdjacentHTML('beforeend', `<details id="debug-panel" style="position:fixed; bottom:10px; right:10px; z-index:500; background:#111; border:1px solid #333; border-radius:8px; padding:8px 12px; font-size:0.75rem; color:#aaa;">
+                <summary style="cursor:pointer; font-weight:900; letter-spacing:2px;">DIAGNOSTIC</summary>
+                <table style="border-spacing:10px 2px;"><thead><tr><th>étape</th><th>n</th><th>dernier</th><th>moy.</th><th>max (ms)</th></tr></thead><tbody id="debug-body"></tbody></table>
+            </details>`);
+            updateFilters = timed('updateFilters', updateFilters, () => ({{ results: popcount(FILTER.final) }}));
+            renderTimeline = timed('renderTimeline', renderTimeline, () => ({{ items: TL.items.length, works: TL.done }})); // Premier écran
+            renderHisto = timed('renderHisto', renderHisto, () => ({{}}));
+            note('script', T_START, {{}});
+            note('init', T_INIT - T_START, {{ works: DATA.length }});
+        }}
+
+        // CANAL (composant Streamlit, cf. channel.py) : la page reste chargée d'une version à l'autre. Elle renvoie
+        // la version affichée (valeur du composant) et reçoit rien, un delta depuis cette version ou le jeu complet
+        const STREAMLIT_URL = CHANNEL ? new URLSearchParams(location.search).get('streamlitUrl') || location.href : null;
+        let VERSION = null, REPORTED, HEIGHT;
+        function toStreamlit(type, data) {{ window.parent.postMessage({{ isStreamlitMessage: true, apiVersion: 1, type, ...data }}, '*'); }}
+
+        function receive(args) {{
+            if(args.height !== HEIGHT) toStreamlit('streamlit:setFrameHeight', {{ height: HEIGHT = args.height }});
+            if(args.debug && !DEBUG) {{ DEBUG = true; enableDebug(); }}
+            const M = JSON.parse(new TextDecoder().decode(args.message));
+            // Jeu complet, ou delta depuis la version affichée ; sinon (autre base) on renvoie notre version
+            if(M.version !== VERSION && (M.base === undefined ? M.payload : M.base === VERSION)) {{
+                const t = performance.now();
+                if(M.base === undefined) loadPayload(M.payload); else applyDelta(M);
+                VERSION = M.version;
+                pruneFilters();
+                const page = document.querySelector('.page.active-page');
+                if(page) renderPage(page.id); // Sans remonter en haut
+                if(DEBUG) note(M.base === undefined ? 'full' : 'delta', performance.now() - t, {{ works: DATA.length, changed: M.base === undefined ? DATA.length : M.index.id.length }});
+            }}
+            if(REPORTED !== VERSION) toStreamlit('streamlit:setComponentValue', {{ value: REPORTED = VERSION, dataType: 'json' }});
+        }}
+
+        function pruneFilters() {{
+            // Filtres gardés d'une version à l'autre, sans les valeurs disparues
+            for(const [set, type] of [[activeGlobal, 'global'], [activeMedia, 'media'], [activeRank, 'rank']]) {{
+                for(const v of set) if(v !== 'All' && !(v in FACETS[type])) set.delete(v);
+                if(set.size === 0) set.add('All');
+            }}
+            for(const [set, type] of [[activeGenres, 'genre'], [activeTags, 'tag']]) for(const v of set) if(!(v in FACETS[type])) set.delete(v);
+        }}
+
+        // DELTA : œuvres ajoutées / modifiées (au format INDEX, avec les nouveaux vocabulaires), ordre complet en plages
+        // [début, longueur] (début >= 0 : positions actuelles ; < 0 : -1 - rang dans M.index) et agrégats changés.
+        // Facettes, recherche et pages de reviews se recalculent ici.
+        function applyDelta(M) {{
+            const A = M.index, V = A.v, old = INDEX;
+            const remap = (from, to) => {{ const at = new Map(to.map((v, c) => [v, c])); return from.map(v => at.get(v)); }};
+            const media = remap(old.v.media, V.media);
+            const map = {{ global: media, media, rank: remap(old.v.rank, V.rank), month: remap(old.v.month, V.month), genres: remap(old.v.genre, V.genre), tags: remap(old.v.tag, V.tag) }};
+            const starts = counts => {{ const s = new Array(counts.length); let k = 0; counts.forEach((n, i) => {{ s[i] = k; k += n; }}); return s; }};
+            const out = {{ id: [], nom: [], v: V, global: [], media: [], rank: [], month: [], day: [], genres: [[], []], tags: [[], []], rp: [] }};
+            let reviewed = 0;
+            const copy = (I, map, at, from, to) => {{
+                // Œuvres from..to-1 de I, codes traduits par map (vocabulaires précédents -> V)
+                for(const f of ['id', 'nom', 'day']) {{ const s = I[f], d = out[f]; for(let i = from; i < to; i++) d.push(s[i]); }}
+                for(const f of ['global', 'media', 'rank', 'month']) {{ const s = I[f], d = out[f], m = map && map[f]; for(let i = from; i < to; i++) d.push(m ? m[s[i]] : s[i]); }}
+                for(const f of ['genres', 'tags']) {{
+                    const [counts, codes] = I[f], [dc, dd] = out[f], m = map && map[f], a = at[f];
+                    for(let i = from; i < to; i++) {{ dc.push(counts[i]); for(let k = a[i], e = k + counts[i]; k < e; k++) dd.push(m ? m[codes[k]] : codes[k]); }}
+                }}
+                // Pages de reviews remplies dans l'ordre, page_size œuvres par page (comme split_payload)
+                for(let i = from; i < to; i++) out.rp.push(I.rp[i] >= 0 ? Math.floor(reviewed++ / M.page_size) : -1);
+            }};
+            const moved = new Int32Array(old.id.length).fill(-1), sent = []; // Nouvelles positions des œuvres gardées / envoyées
+            const at = [old, A].map(I => ({{ genres: starts(I.genres[0]), tags: starts(I.tags[0]) }}));
+            for(let r = 0; r < M.order.length; r += 2) {{
+                const a = M.order[r], n = M.order[r + 1], pos = out.id.length;
+                if(a >= 0) {{ for(let k = 0; k < n; k++) moved[a + k] = pos + k; copy(old, map, at[0], a, a + n); }}
+                else {{ for(let k = 0; k < n; k++) sent[-a - 1 + k] = pos + k; copy(A, null, at[1], -a - 1, -a - 1 + n); }}
+            }}
+
+            // Recherche : postings actuels déplacés (œuvres gardées) + tokens des œuvres envoyées (SEARCH.p en écarts, cf. search_index)
+            const postings = new Map();
+            SEARCH.v.forEach((t, k) => {{
+                const p = [];
+                let i = 0;
+                for(const g of SEARCH.p[k]) {{ i += g; if(moved[i] >= 0) p.push(moved[i]); }}
+                if(p.length) postings.set(t, p);
+            }});
+            M.search.forEach((words, u) => {{ for(const t of words) (postings.get(t) || postings.set(t, []).get(t)).push(sent[u]); }});
+            const v = [...postings.keys()].sort(), ascending = p => {{ for(let k = 1; k < p.length; k++) if(p[k] < p[k - 1]) return p.sort((x, y) => x - y); return p; }};
+            const gaps = p => p.map((x, k) => k ? x - p[k - 1] : x);
+            loadPayload({{ STATS, GLOBALS, MEDIAS, CUBE, SORTED, ...M.payload, INDEX: out, SEARCH: {{ v, p: v.map(t => gaps(ascending(postings.get(t)))) }} }});
+        }}
+
+        if(CHANNEL) {{
+            window.addEventListener('message', e => {{ if(e.data && e.data.type === 'streamlit:render') receive(e.data.args); }});
+            toStreamlit('streamlit:componentReady', {{}});
+        }}
+
+        loadPayload({payload});
+        T_INIT = performance.now();
+        if(DEBUG) enableDebug();
+
+        window.onclick = (e) => {{ if(!e.target.matches('.btn-f')) document.querySelectorAll('.dd-menu').forEach(m => m.classList.remove('show')); }};
+    </script>
+</body>
+</html>
+"""
+
+# Agrégats envoyés tels quels (un delta ne renvoie que ceux qui ont changé, cf. channel.py)
+AGGREGATES = ("STATS", "GLOBALS", "MEDIAS", "CUBE", "SORTED")
+
+
+def js_sorted(values):
+    # Ordre de Array.prototype.sort() : comparaison par unités UTF-16
+    return sorted(values, key=lambda v: v.encode("utf-16-be"))
+
+
+def payload_parts(version, dataset, reviews=True, sheet=LOCAL_SHEET):
+    # Constante JS -> fonction qui la construit (appelée seulement si besoin) ; reviews=False : pas d'écriture des pages
+    works, stats, _, unique_medias = dataset # Histogramme : recalculé côté client depuis le cube
+
+    @functools.cache
+    def split():
+        with stage("payload", version=version):
+            index, pages = split_payload(works)
+            return index, pages, facet_index(works) # Pour les listes de membres ; le client refait les siennes depuis les codes
+
+    return {
+        "INDEX": lambda: split()[0],
+        "STATS": lambda: stats,
+        "GLOBALS": lambda: sorted(set(works.column("global"))),
+        "MEDIAS": lambda: unique_medias,
+        "MEMBERS": lambda: membership_index(split()[2]),
+        "SEARCH": lambda: search_index(works),
+        "CUBE": lambda: chart_cube(works),
+        "REVIEWS_URL": lambda: publish_reviews(split()[1], version, sheet) if reviews else "",
+        "SORTED": lambda: {k: js_sorted(stats.get(k, {})) for k in ("genre", "tag")},
+    }
+
+
+def payload_json(version, dataset, reviews=True, sheet=LOCAL_SHEET):
+    # -> objet JSON de toutes les constantes, mesurées une à une (événement "page")
+    with stage("page", version=version, works=len(dataset[0])) as ev:
+        parts, ev["bytes"], ev["build_ms"] = [], {}, {}
+        for name, build in payload_parts(version, dataset, reviews, sheet).items():
+            t = time.perf_counter()
+            part = json.dumps(build()) # ASCII (ensure_ascii) : longueur = octets
+            ev["build_ms"][name] = round((time.perf_counter() - t) * 1000, 2)
+            ev["bytes"][name] = len(part)
+            parts.append(f'"{name}":{part}')
+        payload = "{" + ",".join(parts) + "}"
+        ev["total_bytes"] = len(payload)
+        return payload
+
+
+def build_page(version, dataset, reviews=True, debug=False, channel=False, sheet=LOCAL_SHEET):
+    # debug : mesures côté client + panneau ; channel : page du composant (données suivantes reçues par messages)
+    return HTML_TEMPLATE.format(payload=payload_json(version, dataset, reviews, sheet), mois=json.dumps(list(MOIS_FR.values())),
+                                debug=json.dumps(debug), channel=json.dumps(channel))
+
+
+def publish_shell():
+    # Page du composant (jeu vide) dans static/component ; réécrite seulement si le template a changé
+    html = build_page("shell", empty_dataset(), reviews=False, channel=True)
+    path = os.path.join(SHELL_DIR, "index.html")
+    try:
+        with open(path, encoding="utf-8") as f:
+            if f.read() == html: return SHELL_DIR
+    except OSError: pass
+    os.makedirs(SHELL_DIR, exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f: f.write(html)
+    os.replace(tmp, path) # Jamais de page à moitié écrite pour une iframe qui charge
+    return SHELL_DIR
@@ -0,0 +1,171 @@
+import json
+import os
+import re
+import shutil
+import tempfile
+import unicodedata
+
+import numpy as np
+
+# PAYLOAD NAVIGATEUR
+# - index léger embarqué dans la page (pas de reviews), encodé par dictionnaire : codes entiers + vocabulaires,
+#   le client reconstruit les œuvres et ses index de facettes (filtres / comptes par bitsets) en une passe
+# - listes de membres des pages détail (médias / moods), tirées des index inversés calculés ici
+# - cube de comptes pré-agrégés pour les graphiques et les murs filtrés
+# - index de recherche (tokens sans accents -> positions), pour RECHERCHER : sous-chaînes des titres (genres, tags, reviews en option)
+# - reviews découpées en pages JSON servies par Streamlit (server.enableStaticServing),
+#   chargées à la demande par goToWork
+
+REVIEW_PAGE_SIZE = 200
+MIN_REVIEW_LEN = 5 # En dessous, la page œuvre n'affiche pas de review
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+REVIEWS_DIR = os.path.join(STATIC_DIR, "reviews")
+REVIEWS_URL = "app/static/reviews" # Relatif à l'URL de l'app
+LOCAL_SHEET = "local" # Sous-dossier des reviews hors multi-sheets (page autonome, benchmarks)
+
+
+def split_payload(works):
+    # -> (index, pages) ; "rp" = numéro de page de la review par œuvre, -1 si pas de review
+    pages, rp = [], []
+    for i, review in zip(works.id, works.review):
+        if len(review) > MIN_REVIEW_LEN:
+            if not pages or len(pages[-1]) >= REVIEW_PAGE_SIZE: pages.append({})
+            pages[-1][i] = review
+            rp.append(len(pages) - 1)
+        else:
+            rp.append(-1)
+    index = {
+        "id": works.id, "nom": works.nom, "v": works.vocab,
+        "global": works.codes["global"].tolist(), "media": works.codes["media"].tolist(), "rank": works.codes["rank"].tolist(),
+        "month": works.codes["month"].tolist(), "day": works.day.tolist(),
+        # Champs multiples : [nombre de valeurs par œuvre, codes à plat] (plus court que des offsets cumulés)
+        "genres": [np.diff(works.offsets["genres"]).tolist(), works.codes["genres"].tolist()],
+        "tags": [np.diff(works.offsets["tags"]).tolist(), works.codes["tags"].tolist()],
+        "rp": rp,
+    }
+    return index, pages
+
+
+def positions(codes, vocab, rows=None):
+    # Codes -> {valeur: positions croissantes} ; rows = ligne de chaque code (champs multiples)
+    order = np.argsort(codes, kind="stable")
+    rows = order if rows is None else rows[order]
+    groups = np.split(rows, np.cumsum(np.bincount(codes, minlength=len(vocab)))[:-1]) if len(vocab) else []
+    return {v: g.tolist() for v, g in zip(vocab, groups) if len(g)}
+
+
+def facet_index(works):
+    # Index inversé valeur -> positions (croissantes) dans works, pour chaque facette filtrable
+    index = {k: positions(works.codes[k], works.vocab[v]) for k, v in (("global", "media"), ("media", "media"), ("rank", "rank"))}
+    for k, v in (("genres", "genre"), ("tags", "tag")):
+        rows = np.repeat(np.arange(len(works)), np.diff(works.offsets[k]))
+        index[v] = positions(works.codes[k], works.vocab[v], rows)
+    return index
+
+
+def membership_index(facets):
+    # Listes des pages détail (MÉDIAS = global ou média, MOODS = genre ou tag).
+    # Seules les unions sont envoyées ; sinon le client reprend directement la liste de FACETS.
+    members = {"media": {}, "mood": {}}
+    for kind, (a, b) in (("media", ("global", "media")), ("mood", ("genre", "tag"))):
+        for val in facets[a].keys() & facets[b].keys():
+            members[kind][val] = sorted(set(facets[a][val]) | set(facets[b][val]))
+    return members
+
+
+def chart_cube(works):
+    # Comptes pré-agrégés par cellule (mois, global, média, rank) + genres / tags par cellule : le client ne garde
+    # que les cellules des filtres actifs pour redessiner histogramme, top genres et murs sans repasser sur les œuvres
+    # -> {"m", "g", "d", "r", "n"} (une entrée par cellule non vide) ;
+    #    "genre" / "tag" = [nombre d'entrées par cellule, codes, comptes], entrées rangées par cellule
+    out = {"m": [], "g": [], "d": [], "r": [], "n": [], "genre": [[], [], []], "tag": [[], [], []]}
+    if not len(works): return out
+    dims = [works.codes[k] for k in ("month", "global", "media", "rank")]
+    shape = [len(works.vocab[v]) for v in ("month", "media", "media", "rank")]
+    cells, cell_of, counts = np.unique(np.ravel_multi_index(dims, shape), return_inverse=True, return_counts=True)
+    for k, a in zip(("m", "g", "d", "r"), np.unravel_index(cells, shape)): out[k] = a.tolist()
+    out["n"] = counts.tolist()
+    for k, v in (("genres", "genre"), ("tags", "tag")):
+        size = len(works.vocab[v])
+        rows = np.repeat(np.arange(len(works)), np.diff(works.offsets[k]))
+        pairs, n = np.unique(cell_of[rows].astype(np.int64) * size + works.codes[k], return_counts=True)
+        out[v] = [np.bincount(pairs // size, minlength=len(cells)).tolist(), (pairs % size).tolist(), n.tolist()]
+    return out
+
+
+TOKEN_RE = re.compile(r'[^\W_]+')
+LIGATURES = str.maketrans({"œ": "oe", "æ": "ae", "ß": "ss"})
+
+
+def fold(text):
+    # Minuscules sans accents ni ligatures ("Œuvre Épique" -> "oeuvre epique") ; même règle que fold() côté JS
+    text = unicodedata.normalize("NFKD", text.lower().translate(LIGATURES))
+    return "".join(ch for ch in text if not unicodedata.category(ch).startswith("M"))
+
+
+def tokens(text):
+    return set(TOKEN_RE.findall(fold(text)))
+
+
+def suffixes(words):
+    # Tous les suffixes de chaque mot : un mot tapé, cherché comme préfixe parmi eux, trouve aussi
+    # l'intérieur des mots ("man" -> "batman"), comme l'ancienne recherche par sous-chaîne
+    return {w[k:] for w in words for k in range(len(w))}
+
+
+def work_tokens(works, with_labels=False, with_reviews=False):
+    # Tokens cherchables de chaque œuvre : les suffixes des mots du titre ; en option genres / tags (calculés une fois
+    # par valeur du vocabulaire) et mots de la review, cherchés par début de mot
+    multi = []
+    for k, v in (("genres", "genre"), ("tags", "tag")) if with_labels else ():
+        toks = [tokens(x) for x in works.vocab[v]]
+        off, codes = works.offsets[k].tolist(), works.codes[k].tolist()
+        multi.append([set().union(*(toks[c] for c in codes[a:b])) for a, b in zip(off, off[1:])])
+    out = []
+    for i, nom in enumerate(works.nom):
+        words = suffixes(tokens(nom)).union(*(m[i] for m in multi))
+        if with_reviews: words |= tokens(works.review[i].replace("<br>", " "))
+        out.append(words)
+    return out
+
+
+def search_index(works, with_labels=False, with_reviews=False):
+    # Vocabulaire trié + positions par token : le client cherche chaque mot tapé comme préfixe
+    # (plage du vocabulaire par dichotomie) ; avec les suffixes des titres, cela revient à une recherche par
+    # sous-chaîne sans envoyer tous les n-grammes. Titres seuls par défaut : les genres / tags ont leurs propres filtres
+    postings = {}
+    for i, words in enumerate(work_tokens(works, with_labels, with_reviews)):
+        for t in words:
+            postings.setdefault(t, []).append(i)
+    vocab = sorted(postings)
+    # Positions croissantes envoyées en écarts (la première telle quelle) : petits nombres, JSON plus court
+    return {"v": vocab, "p": [[p[0]] + [b - a for a, b in zip(p, p[1:])] for p in map(postings.get, vocab)]}
+
+
+def review_dir(version, sheet=LOCAL_SHEET):
+    return os.path.join(REVIEWS_DIR, sheet, version)
+
+
+def publish_reviews(pages, version, sheet=LOCAL_SHEET, keep=3):
+    # Écrit static/reviews/<sheet>/<version>/<n>.json (une seule fois par version) et garde les dernières versions du sheet
+    # (les autres sheets ne sont pas touchés : leurs pages peuvent encore être servies)
+    root, target = os.path.join(REVIEWS_DIR, sheet), review_dir(version, sheet)
+    if not os.path.isdir(target):
+        os.makedirs(root, exist_ok=True)
+        tmp = tempfile.mkdtemp(dir=root, prefix=".tmp-")
+        for n, page in enumerate(pages):
+            with open(os.path.join(tmp, f"{n}.json"), "w", encoding="utf-8") as f:
+                json.dump(page, f, ensure_ascii=False)
+        try: os.rename(tmp, target)
+        except OSError: shutil.rmtree(tmp, ignore_errors=True) # Publiée entre-temps par un autre process
+
+    old = sorted((e for e in os.scandir(root) if e.is_dir() and not e.name.startswith(".")), key=lambda e: e.stat().st_mtime, reverse=True)
+    for e in old[keep:]:
+        if e.name != version: shutil.rmtree(e.path, ignore_errors=True)
+    return f"{REVIEWS_URL}/{sheet}/{version}"
+
+
+def ensure_reviews(works, version, sheet=LOCAL_SHEET):
+    # Message servi depuis un cache : ses pages de reviews ont pu être élaguées depuis, on les réécrit
+    if not os.path.isdir(review_dir(version, sheet)): publish_reviews(split_payload(works)[1], version, sheet)
@@ -0,0 +1,84 @@
+import json
+import os
+import tempfile
+
+import numpy as np
+import pyarrow as pa
+
+from engine import Works
+from instrument import record
+
+# SNAPSHOT DISQUE (Arrow IPC, non compressé pour pouvoir être mappé en mémoire)
+# Works tel quel (codes, offsets des genres / tags) ; vocabulaires, stats / histo / médias + hash et taille du CSV source
+# dans les métadonnées du schéma
+
+SNAPSHOT_DIR = os.environ.get("RETRO_SNAPSHOT_DIR", ".snapshots")
+FORMAT = "4" # À incrémenter quand le contenu dérivé change (ex. ids stables) : les anciennes snapshots sont ignorées
+
+SCHEMA = pa.schema([
+    ("id", pa.string()), ("nom", pa.string()), ("review", pa.string()),
+    ("global", pa.int32()), ("media", pa.int32()), ("rank", pa.int32()), ("month", pa.int32()), ("day", pa.uint8()),
+    ("genres", pa.list_(pa.int32())), ("tags", pa.list_(pa.int32())),
+])
+
+
+class SnapshotStore:
+    def __init__(self, name, directory=SNAPSHOT_DIR):
+        self.path = os.path.join(directory, f"{name}.arrow")
+
+    def save(self, dataset, digest, size=0):
+        works, stats, histo_data, unique_medias = dataset
+        meta = {
+            "format": FORMAT,
+            "digest": digest or "",
+            "size": str(size), # Taille du CSV : empreinte mémoire du sheet dans le loader dès la reprise
+            "vocab": json.dumps(works.vocab),
+            "stats": json.dumps(stats),
+            "histo": json.dumps(histo_data),
+            "medias": json.dumps(unique_medias),
+        }
+        cols = [pa.array(works.id, pa.string()), pa.array(works.nom, pa.string()), pa.array(works.review, pa.string())]
+        cols += [pa.array(works.codes[k]) for k in ("global", "media", "rank", "month")] + [pa.array(works.day)]
+        cols += [pa.ListArray.from_arrays(works.offsets[k], works.codes[k]) for k in ("genres", "tags")]
+        table = pa.Table.from_arrays(cols, schema=SCHEMA.with_metadata(meta))
+
+        # Écriture atomique : un process qui démarre ne lit jamais un fichier à moitié écrit
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(self.path) or ".", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f, pa.ipc.new_file(f, table.schema) as w:
+                w.write_table(table)
+            os.replace(tmp, self.path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    def load(self):
+        # -> (dataset, digest, taille du CSV), ou None si pas de snapshot lisible
+        if not os.path.exists(self.path): return None
+        try:
+            with pa.memory_map(self.path, "r") as src:
+                table = pa.ipc.open_file(src).read_all()
+                meta = {k.decode(): v.decode() for k, v in (table.schema.metadata or {}).items()}
+                if meta.get("format") != FORMAT: return None
+                works = from_table(table, json.loads(meta["vocab"]))
+        except (pa.ArrowInvalid, OSError) as e:
+            record("snapshot", path=self.path, error=repr(e)) # Snapshot illisible : démarrage à froid sans elle
+            return None
+
+        # JSON a transformé les clés int de l'histo en str
+        histo_data = {int(k): v for k, v in json.loads(meta["histo"]).items()}
+        dataset = (works, json.loads(meta["stats"]), histo_data, json.loads(meta["medias"]))
+        return dataset, meta["digest"] or None, int(meta.get("size") or 0)
+
+
+def from_table(table, vocab):
+    # Copie des colonnes hors du fichier mappé (qui est refermé après lecture)
+    col = lambda k: np.array(table.column(k).combine_chunks().to_numpy(zero_copy_only=False))
+    codes, offsets = {k: col(k) for k in ("global", "media", "rank", "month")}, {}
+    for k in ("genres", "tags"):
+        lists = table.column(k).combine_chunks()
+        off = lists.offsets.to_numpy()
+        offsets[k], codes[k] = (off - off[0]).astype(np.int32), np.array(lists.flatten().to_numpy(zero_copy_only=False), dtype=np.int32)
+    text = {k: table.column(k).to_pylist() for k in ("id", "nom", "review")}
+    return Works(text["id"], text["nom"], text["review"], codes, col("day"), offsets, vocab)
@@ -0,0 +1,200 @@
+import hashlib
+import io
+import os
+import threading
+import time
+from collections import Counter
+
+import pandas as pd
+import requests
+
+from engine import Accumulator, Works, assign_ids, derive_rows, empty_dataset, export, list_medias, prepare, to_columns, to_records
+from ingest import SourceReader, ingest, read_frame
+from instrument import stage
+
+# SYNCHRO INCRÉMENTALE DU SHEET
+# - requête conditionnelle (ETag / Last-Modified) + hash du contenu : rien à refaire si inchangé
+# - sinon seules les lignes nouvelles / modifiées sont re-dérivées, et stats/histo sont patchés par deltas
+# - très gros exports (> RETRO_STREAM_MB) : lecture en flux par blocs, sans garder le CSV ni le cache de lignes
+
+
+def sheet_url(sheet_id):
+    return f"https://docs.google.com/spreadsheets/d/{sheet_id}/export?format=csv"
+
+
+FOOTPRINT_FACTOR = 4
+PARALLEL_MIN_ROWS = 2000 # En dessous, dériver sur place coûte moins que l'envoi au process pool
+STREAM_MIN_BYTES = int(os.environ.get("RETRO_STREAM_MB", "64")) * 1024 * 1024
+
+
+class SheetSync:
+    def __init__(self, url, session=None, timeout=20, store=None, executor=None, stream_min_bytes=STREAM_MIN_BYTES, name=None):
+        self.url = url
+        self.name = name or url # Pour les journaux (cf. instrument.py)
+        self.stream_min_bytes = stream_min_bytes
+        self.store = store
+        self.executor = executor # ProcessPoolExecutor partagé (optionnel) pour derive_rows
+        self.session = session or requests.Session()
+        self.timeout = timeout
+        self.lock = threading.Lock() # Une synchro à la fois ; les lectures ne le prennent pas (cf. current)
+
+        # Dernier état connu
+        self.size = 0 # taille du dernier CSV lu
+        self.digest = None
+        self.etag = None
+        self.last_modified = None
+        self.columns = None
+        self.row_hashes = Counter()
+        self.records = {}  # hash de ligne brute -> champs dérivés (None si ligne ignorée)
+        self.acc = Accumulator()  # compteurs courants, patchés par deltas
+        self.dataset = empty_dataset()
+
+        self.counters = {"hits": 0, "misses": 0, "not_modified": 0, "rows_reprocessed": 0}
+        self.checked_at = None # time.monotonic() de la dernière tentative de synchro
+        self.latest = None # (jeu de données, hash du CSV) publiés ensemble ; None tant que rien n'est disponible
+
+        # Démarrage à froid : dernier jeu valide depuis le disque
+        snap = store.load() if store else None
+        if snap: self.seed(*snap)
+
+    def seed(self, dataset, digest, size=0):
+        # Reprise depuis une snapshot : un sheet identique sera un hit, sinon reconstruction complète
+        with self.lock:
+            self.dataset, self.digest, self.size = dataset, digest, size
+            self.latest = (dataset, digest)
+
+    def current(self):
+        # Dernier état complet, sans attendre une synchro en cours (le tuple est remplacé d'un bloc)
+        return self.latest or (empty_dataset(), None)
+
+    def footprint(self):
+        # Estimation grossière de la mémoire tenue (cache de lignes + jeu exporté + compteurs), proportionnelle au CSV lu
+        return self.size * FOOTPRINT_FACTOR
+
+    def fetch(self):
+        # -> (réponse (corps pas encore lu) ou None si le serveur répond 304, validateurs ETag / Last-Modified).
+        # Les validateurs ne sont gardés qu'une fois le contenu publié (cf. sync) : sinon un corps tronqué
+        # ou illisible donnerait ensuite des 304 sur des données jamais chargées
+        headers = {}
+        if self.etag: headers["If-None-Match"] = self.etag
+        if self.last_modified: headers["If-Modified-Since"] = self.last_modified
+        resp = self.session.get(self.url, headers=headers, timeout=self.timeout, stream=True)
+        if resp.status_code == 304:
+            resp.close()
+            return None, (self.etag, self.last_modified)
+        resp.raise_for_status()
+        return resp, (resp.headers.get("ETag", self.etag), resp.headers.get("Last-Modified", self.last_modified))
+
+    def streams(self, resp):
+        # Taille annoncée par le serveur, sinon celle de la dernière lecture
+        size = int(resp.headers.get("Content-Length") or self.size)
+        return size >= self.stream_min_bytes
+
+    def sync(self):
+        with self.lock, stage("sync", sheet=self.name) as ev:
+            self.checked_at = time.monotonic()
+            with stage("fetch", sheet=self.name) as f:
+                resp, validators = self.fetch()
+                f["status"] = 304 if resp is None else resp.status_code
+            if resp is None:
+                ev["outcome"] = "not_modified"
+                self.counters["not_modified"] += 1
+                self.counters["hits"] += 1
+                self.latest = (self.dataset, self.digest)
+                return self.dataset
+
+            streaming = self.streams(resp)
+            with resp, stage("ingest" if streaming else "download", sheet=self.name) as d:
+                if streaming: # Le hash n'est connu qu'en fin de lecture : sur un hit, le travail fait est jeté
+                    resp.raw.decode_content = True
+                    src = SourceReader(resp.raw)
+                    out = ingest(src)
+                    digest, size = src.hexdigest(), src.size
+                else:
+                    body = resp.content
+                    digest, size = hashlib.sha256(body).hexdigest(), len(body)
+                d["bytes"] = size
+
+            if digest == self.digest:
+                ev["outcome"] = "hit"
+                self.counters["hits"] += 1
+                self.size = size # Snapshot d'avant la taille dans les métadonnées : l'empreinte se corrige ici
+                self.latest = (self.dataset, self.digest)
+                self.etag, self.last_modified = validators
+                return self.dataset
+
+            ev["outcome"] = "miss"
+            self.counters["misses"] += 1
+            reprocessed = self.counters["rows_reprocessed"]
+            if streaming: self.dataset = self.apply_stream(out)
+            else:
+                with stage("parse", sheet=self.name) as p:
+                    df = read_frame(SourceReader(io.BytesIO(body)))
+                    p["rows"] = len(df)
+                self.dataset = self.apply(df)
+            ev["rows_reprocessed"] = self.counters["rows_reprocessed"] - reprocessed
+            ev["works"] = len(self.dataset[0])
+            self.size, self.digest = size, digest
+            self.latest = (self.dataset, digest)
+            self.etag, self.last_modified = validators
+            if self.store:
+                try:
+                    with stage("snapshot", sheet=self.name): self.store.save(self.dataset, digest, size)
+                except OSError: pass # Journalisé par l'étape "snapshot" ; la synchro reste valide sans snapshot
+            return self.dataset
+
+    def apply_stream(self, out):
+        # Reconstruction complète ; le cache de lignes (qui doublerait la mémoire) est abandonné
+        self.columns, self.row_hashes, self.records, self.acc = None, Counter(), {}, Accumulator()
+        if out is None: return Works.empty(), {}, {}, []
+        store, self.acc = out
+        self.counters["rows_reprocessed"] += len(store)
+        with stage("export", sheet=self.name, rows=len(store)):
+            rows = assign_ids(store.cols)
+            return export(rows), self.acc.stats(), self.acc.histo_data(), list_medias(rows)
+
+    def apply(self, df):
+        df, c = prepare(df)
+        if not c["nom"]: return Works.empty(), {}, {}, []
+
+        # Mapping différent (colonnes renommées / ajoutées) : on repart de zéro
+        if df.columns.tolist() != self.columns:
+            self.columns = df.columns.tolist()
+            self.row_hashes, self.records, self.acc = Counter(), {}, Accumulator()
+
+        hashes = pd.util.hash_pandas_object(df, index=False).tolist()
+        new_hashes = Counter(hashes)
+
+        # Dérivation des lignes jamais vues uniquement
+        todo = [i for i, h in enumerate(hashes) if h not in self.records]
+        if todo:
+            sub = df.iloc[todo]
+            pooled = bool(self.executor) and len(todo) >= PARALLEL_MIN_ROWS
+            with stage("derive", sheet=self.name, rows=len(todo), pooled=pooled):
+                rows = self.executor.submit(derive_rows, sub, c).result() if pooled else derive_rows(sub, c)
+            derived = {r["id"]: r for r in to_records(rows)}
+            for i in todo:
+                self.records[hashes[i]] = derived.get(str(df.index[i]))
+            self.counters["rows_reprocessed"] += len(todo)
+
+        # Deltas : lignes disparues (-) / apparues (+), avec multiplicité, dans l'ordre du sheet
+        minus, plus = self.row_hashes - new_hashes, new_hashes - self.row_hashes
+        removed = [self.records[h] for h, n in minus.items() for _ in range(n) if self.records[h]]
+        added = []
+        for h in hashes:
+            if plus[h] > 0:
+                plus[h] -= 1
+                if self.records[h]: added.append(self.records[h])
+
+        if removed: self.acc.add(to_columns(removed), -1)
+        if added: self.acc.add(to_columns(added), 1)
+
+        # Nettoyage du cache de lignes
+        self.records = {h: r for h, r in self.records.items() if h in new_hashes}
+        self.row_hashes = new_hashes
+
+        # Réassemblage dans l'ordre du sheet (ids recalculés sur l'ensemble pour départager les doublons)
+        with stage("export", sheet=self.name, rows=len(hashes)):
+            rows = assign_ids(to_columns([self.records[h] for h in hashes if self.records[h]]))
+            if removed or added: self.acc.reorder(rows) # Mêmes stats / histo qu'une construction complète, ordre des clés compris
+            return export(rows), self.acc.stats(), self.acc.histo_data(), list_medias(rows)
@@ -0,0 +1,94 @@
+import json
+
+import pandas as pd
+import pytest
+
+import payload
+from channel import History, delta_message, diff
+from engine import build_dataset, empty_dataset
+
+
+def test_history_is_per_sheet():
+    history = History(size=2)
+    history.add("a", "a1", "A1")
+    for n in range(5): history.add("b", f"b{n}", n) # Un autre sheet très actif
+    assert history.get("a", "a1") == "A1"
+    assert history.get("b", "b2") is None and history.get("b", "b4") == 4
+    assert history.get("b", "a1") is None
+    history.drop("a")
+    assert history.get("a", "a1") is None
+
+
+COLUMNS = ["Nom", "Média global", "Rank", "Fin", "Genres", "Review"]
+ROWS = [
+    ["Dune", "Livre", "Cool", "05/01/2024", "SF", "Un classique, relu cet hiver"],
+    ["Zelda", "Jeu vidéo", "Parfait", "10/02/2024", "Aventure", "Immense"],
+    ["Alien", "Film", "Sympa", "03/01/2024", "SF, Horreur", ""],
+    ["Heat", "Film", "Cool +", "", "Action", "Long et tendu"],
+    ["Totoro", "Anime", "Parfait", "15/03/2024", "Fantasy", ""],
+]
+
+
+def dataset(rows):
+    return build_dataset(pd.DataFrame(rows, columns=COLUMNS))
+
+
+def rebuild(old_ids, order, sent_ids):
+    # Ordre des ids reconstruit comme applyDelta (page.py) : plages de positions anciennes ou d'œuvres envoyées
+    out = []
+    for a, n in zip(order[::2], order[1::2]):
+        out += old_ids[a:a + n] if a >= 0 else sent_ids[-1 - a:-1 - a + n]
+    return out
+
+
+@pytest.fixture
+def reviews(tmp_path, monkeypatch):
+    monkeypatch.setattr(payload, "REVIEWS_DIR", str(tmp_path)) # REVIEWS_URL publie les pages de la version
+
+
+def delta(base, new):
+    return json.loads(delta_message("v1", base, "v2", new))
+
+
+def test_diff_rebuilds_new_order():
+    old = dataset(ROWS)[0]
+    rows = [list(r) for r in ROWS]
+    rows[2][2] = "Cool" # Alien modifié
+    rows.insert(1, ["Batman", "Film", "Cool", "01/03/2024", "Action", ""]) # Ajout
+    del rows[4] # Heat supprimé
+    new = dataset(rows)[0]
+    order, sent = diff(old, new)
+    assert rebuild(old.id, order, [new.id[k] for k in sent]) == new.id
+    assert sorted(new.nom[k] for k in sent) == ["Alien", "Batman"] # Œuvres inchangées non envoyées
+    assert len(order) // 2 < len(new) # Positions consécutives regroupées en plages
+
+
+def test_delta_sends_only_changed_works(reviews):
+    base = dataset(ROWS)
+    rows = [list(r) for r in ROWS]
+    rows[1][1] = "Film"
+    msg = delta(base, dataset(rows))
+    assert msg["index"]["nom"] == ["Zelda"] and len(msg["search"]) == 1 # Tokens de recherche des seules œuvres envoyées
+    assert rebuild(base[0].id, msg["order"], msg["index"]["id"]) == dataset(rows)[0].id
+    assert "STATS" in msg["payload"] and "CUBE" in msg["payload"]
+
+
+def test_review_text_edit_sends_no_work(reviews):
+    base = dataset(ROWS)
+    rows = [list(r) for r in ROWS]
+    rows[0][5] = "Un classique, relu cet hiver puis cet été"
+    msg = delta(base, dataset(rows))
+    assert msg["index"]["id"] == [] and msg["order"] == [0, len(ROWS)]
+    assert msg["payload"]["REVIEWS_URL"].endswith("/v2") # Le client relit les pages de la nouvelle version
+    assert set(msg["payload"]) == {"REVIEWS_URL"}
+
+
+def test_delta_from_and_to_empty(reviews):
+    full = dataset(ROWS)
+    msg = delta(empty_dataset(), full)
+    assert msg["order"] == [-1, len(ROWS)] and msg["index"]["id"] == full[0].id
+    assert rebuild([], msg["order"], msg["index"]["id"]) == full[0].id
+
+    msg = delta(full, empty_dataset())
+    assert msg["order"] == [] and msg["index"]["id"] == []
+    assert msg["payload"]["STATS"] == empty_dataset()[1]
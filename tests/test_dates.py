@@ -0,0 +1,78 @@
+import re
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from dates import DateResolver
+
+pytestmark = pytest.mark.filterwarnings("ignore:Parsing dates:UserWarning") # dayfirst sur de l'ISO, côté référence
+
+
+def reference_date(fin, debut, sessions):
+    # Repli de load_data d'origine, sur des scalaires : Fin, sinon Début, sinon dernière date de "Autres sessions"
+    ref = pd.to_datetime(fin, dayfirst=True, errors='coerce')
+    if pd.isnull(ref): ref = pd.to_datetime(debut, dayfirst=True, errors='coerce')
+    sessions = "" if pd.isnull(sessions) else str(sessions).strip() # get_val
+    if pd.isnull(ref) and sessions:
+        dates = re.findall(r'\d{1,2}/\d{1,2}/\d{4}', sessions)
+        if dates: ref = pd.to_datetime(dates[-1], dayfirst=True, errors='coerce')
+    return ref
+
+
+def resolve(rows, resolver=None):
+    fin, debut, sessions = (pd.Series(col, dtype=object) for col in zip(*rows))
+    out = (resolver or DateResolver()).resolve(fin, debut, sessions.fillna(""), index=fin.index)
+    return [None if pd.isnull(d) else d.strftime("%Y-%m-%d") for d in out]
+
+
+CASES = [
+    # (Fin, Début, Autres sessions)
+    ("15/03/2023", "01/02/2023", "01/01/2020"), # Fin avant Début
+    (np.nan, "01/02/2023", "01/01/2020"), # puis Début
+    ("", "", "vu le 1/2/2021 puis le 7/11/2021"), # puis dernière session
+    (np.nan, np.nan, "12/05/2022, 03/06/2022"),
+    ("31/02/2024", "05/01/2024", ""), # Date impossible : repli
+    ("31/02/2024", np.nan, "aucune date"),
+    (np.nan, np.nan, np.nan),
+    ("", "", ""),
+    ("nan", "  ", ""),
+    ("5/1/2024", np.nan, ""), # Un seul chiffre
+    ("2024-03-20", np.nan, ""), # ISO, jour > 12
+    ("2024-03-20 00:00:00", np.nan, ""),
+    ("2024-13-05", np.nan, ""), # ISO impossible : pandas tranche
+    ("March 5, 2024", np.nan, ""), # Format libre : pandas
+    ("20/03/2024", "2024-03-20", "01/01/2020"),
+]
+
+
+def test_matches_reference_fallback():
+    expected = [reference_date(*row) for row in CASES]
+    assert resolve(CASES) == [None if pd.isnull(d) else d.strftime("%Y-%m-%d") for d in expected]
+
+
+def test_iso_day_up_to_12_is_year_month_day():
+    # Changement documenté : dayfirst lisait 2024-03-05 comme le 3 mai
+    assert reference_date("2024-03-05", None, "").strftime("%Y-%m-%d") == "2024-05-03"
+    assert resolve([("2024-03-05", np.nan, ""), ("2024-03-05 00:00:00", np.nan, "")]) == ["2024-03-05", "2024-03-05"]
+
+
+@pytest.mark.parametrize("value", ["01/01/2300", "2300-01-01", "01/01/1500", "1 janvier 2300"])
+def test_out_of_range_years_are_no_date(value):
+    # Changement documenté : OutOfBoundsDatetime faisait échouer tout le sheet ; la date est maintenant ignorée
+    assert resolve([(value, np.nan, ""), (value, "05/01/2024", ""), (np.nan, np.nan, value.replace("-", "/"))]) == [None, "2024-01-05", None]
+
+
+def test_memo_and_stats():
+    resolver = DateResolver()
+    rows = [("01/02/2023", np.nan, ""), ("01/02/2023", np.nan, ""), ("March 5, 2024", np.nan, "")]
+    first = resolve(rows, resolver)
+    assert resolve(rows, resolver) == first
+    stats = resolver.stats()
+    assert stats["fast"] == 1 and stats["slow"] == 1 and stats["hits"] == 2 and stats["size"] == 2
+
+
+def test_memo_is_bounded():
+    resolver = DateResolver(max_entries=3)
+    resolver.parse([f"0{n}/01/2024" for n in range(1, 8)])
+    assert len(resolver.dates) <= 3
@@ -0,0 +1,20 @@
+import pandas as pd
+
+from engine import build_dataset
+
+
+def works_of(rows):
+    # -> [(titre, date, id)] dans l'ordre d'export (chronologique)
+    works = build_dataset(pd.DataFrame(rows, columns=["Nom", "Média global", "Fin"]))[0]
+    return list(zip(works.nom, works.column("date_full"), works.id))
+
+
+def test_duplicate_title_keeps_existing_id():
+    # Un doublon ajouté (même titre et médias) ne change pas l'id de l'œuvre déjà là : le delta ne la renvoie pas
+    # et les liens vers elle restent valides
+    base = [["Dune", "Livre", "01/02/2024"], ["Alien", "Film", "03/01/2024"]]
+    before = works_of(base)
+    after = works_of(base + [["Dune", "Livre", "05/06/2024"], ["Dune", "Livre", "05/06/2024"]])
+    assert after[:2] == before
+    assert len({i for _, _, i in after}) == 4 # Même titre et même date : départagés par le numéro d'occurrence
+
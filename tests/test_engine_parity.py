@@ -0,0 +1,158 @@
+import io
+import json
+import re
+
+import pandas as pd
+import pytest
+
+from engine import build_dataset
+
+
+def reference_load(df):
+    # Boucle itertuples d'origine (load_data), à deux écarts documentés près : les cellules sont lues par nom de
+    # colonne (itertuples renommait les en-têtes non identifiants, ex. 'Média global', lus vides), et une colonne
+    # Fin / Début absente vaut "pas de date" au lieu de faire échouer tout le chargement
+    df.columns = [c.strip() for c in df.columns]
+    df = df.dropna(subset=['Nom'])
+    cols = df.columns.tolist()
+
+    def find_c(possible_names):
+        for p in possible_names:
+            if p in cols: return p
+        return None
+
+    c_nom = find_c(['Nom'])
+    c_glob = find_c(['Média global', 'Media global', 'Global'])
+    c_det = find_c(['Média', 'Media'])
+    c_rank = find_c(['Rank', 'Classement'])
+    c_debut = find_c(['Début', 'Debut'])
+    c_fin = find_c(['Fin', 'End'])
+    c_autre = find_c(['Autres sessions', 'Sessions'])
+    c_rev = find_c(['Review'])
+    c_genre = find_c(['Genres'])
+    c_tag = find_c(['Tags'])
+
+    db_export = []
+    stats = {"media": {}, "rank": {"Parfait": 0, "Coup de cœur": 0, "Cool +": 0, "Cool": 0, "Sympa +": 0, "Sympa": 0, "Sans Rank": 0}, "genre": {}, "tag": {}}
+    histo_data = {}
+    unique_medias = []
+    MOIS_FR = {1: 'JANVIER', 2: 'FÉVRIER', 3: 'MARS', 4: 'AVRIL', 5: 'MAI', 6: 'JUIN', 7: 'JUILLET', 8: 'AOÛT', 9: 'SEPTEMBRE', 10: 'OCTOBRE', 11: 'NOVEMBRE', 12: 'DÉCEMBRE'}
+
+    for index, values in zip(df.index, df.itertuples(index=False, name=None)):
+        row = dict(zip(cols, values))
+
+        def get_val(col_name):
+            if not col_name: return ""
+            val = str(row.get(col_name, '')).strip()
+            return "" if val.lower() == 'nan' else val
+
+        nom = get_val(c_nom)
+        if not nom: continue
+        m_glob = get_val(c_glob) or "Autre"
+        m_det = get_val(c_det) or m_glob
+        rank = get_val(c_rank) or "Sans Rank"
+
+        ref_date = pd.to_datetime(row.get(c_fin), dayfirst=True, errors='coerce')
+        if pd.isnull(ref_date):
+            ref_date = pd.to_datetime(row.get(c_debut), dayfirst=True, errors='coerce')
+        if pd.isnull(ref_date) and c_autre:
+            sessions = get_val(c_autre)
+            if sessions:
+                dates = re.findall(r'\d{1,2}/\d{1,2}/\d{4}', sessions)
+                if dates:
+                    ref_date = pd.to_datetime(dates[-1], dayfirst=True, errors='coerce')
+
+        m_lbl, m_sort, d_aff = "INCONNU", 999999, "?"
+        if pd.notnull(ref_date):
+            m_lbl = f"{MOIS_FR.get(ref_date.month, '')} {ref_date.year}"
+            m_sort = int(ref_date.strftime("%Y%m"))
+            d_aff = ref_date.strftime("%d/%m")
+
+        stats["media"][m_glob] = stats["media"].get(m_glob, 0) + 1
+        if m_det != m_glob: stats["media"][m_det] = stats["media"].get(m_det, 0) + 1
+        stats["rank"][rank] = stats["rank"].get(rank, 0) + 1
+        gs = [x.strip() for x in get_val(c_genre).split(',') if x.strip()]
+        for g in gs: stats["genre"][g] = stats["genre"].get(g, 0) + 1
+        ts = [x.strip() for x in get_val(c_tag).split(',') if x.strip()]
+        for t in ts: stats["tag"][t] = stats["tag"].get(t, 0) + 1
+        if not any(x['media'] == m_det for x in unique_medias):
+            unique_medias.append({'media': m_det, 'global': m_glob})
+        if m_sort < 900000:
+            if m_sort not in histo_data: histo_data[m_sort] = {"label": m_lbl, "total": 0, "sort": m_sort, "breakdown": {}}
+            histo_data[m_sort]["total"] += 1
+            histo_data[m_sort]["breakdown"][m_glob] = histo_data[m_sort]["breakdown"].get(m_glob, 0) + 1
+
+        db_export.append({
+            "id": str(index), "nom": nom, "unique_key": nom.lower(),
+            "global": m_glob, "media": m_det, "rank": rank,
+            "genres": gs, "tags": ts,
+            "mois_display": m_lbl, "sort_key": m_sort, "date_aff": d_aff,
+            "date_full": ref_date.strftime("%d/%m/%Y") if pd.notnull(ref_date) else "?",
+            "review": get_val(c_rev).replace('\n', '<br>'),
+        })
+
+    db_export = sorted(db_export, key=lambda x: (x['sort_key'], x['date_aff']))
+    stats["rank"] = {k: v for k, v in stats["rank"].items() if v > 0}
+    return db_export, stats, histo_data, unique_medias
+
+
+ROWS = """Nom,{glob},{det},{rank},{debut},{fin},{autre},Review,Genres,Tags,Plateforme
+Zelda,Jeu vidéo,,Parfait,01/02/2023,15/03/2023,,"Très bien
+vraiment",Aventure,"Open world, Culte"
+Dune,Livre,Roman,Cool,05/01/2024,,,Court,"SF, Aventure,,",,Kindle
+  Alien  ,Film,,Cool +,,,"12/05/2022, 03/06/2022",,Horreur,
+Sans date,Série,Série,,,,,nan,,,
+Sessions seules,Manga,Seinen,Sympa,,,"vu le 1/2/2021 puis le 7/11/2021",,,Relu
+Impossible,Film,,Sympa +,31/02/2024,,,,,
+,Film,,Cool,01/01/2020,,,,,
+nan,Film,,Cool,01/01/2020,,,,,
+Zelda,Jeu vidéo,Switch,Coup de cœur,,20/03/2023,,,Aventure,
+Mars,Anime,,,3/3/2021,28/03/2021,,,"Action , Drame",Culte
+"""
+
+HEADERS = {
+    "accents": dict(glob="Média global", det="Média", rank="Rank", debut="Début", fin="Fin", autre="Autres sessions"),
+    "renamed": dict(glob="Media global", det="Media", rank="Classement", debut="Debut", fin="End", autre="Sessions"),
+}
+
+
+def frame(headers, drop=()):
+    df = pd.read_csv(io.StringIO(ROWS.format(**headers)))
+    return df.drop(columns=list(drop))
+
+
+def current(df):
+    works, stats, histo, medias = build_dataset(df)
+    return works.records(), stats, histo, medias
+
+
+def without_ids(records):
+    # Ids : position dans le sheet avant, tirés du contenu depuis (cf. assign_ids)
+    return [{k: v for k, v in r.items() if k != "id"} for r in records]
+
+
+@pytest.mark.parametrize("headers", HEADERS)
+@pytest.mark.parametrize("drop", [(), ("fin", "debut"), ("autre",)], ids=["all", "no-fin-debut", "no-sessions"])
+def test_matches_reference_loop(headers, drop):
+    h = HEADERS[headers]
+    df = frame(h, [h[k] for k in drop])
+    records, stats, histo, medias = current(df.copy())
+    ref_records, ref_stats, ref_histo, ref_medias = reference_load(df.copy())
+
+    assert without_ids(records) == without_ids(ref_records)
+    # Même contenu et même ordre des clés (l'ordre des dicts est visible dans la page)
+    assert json.dumps(stats) == json.dumps(ref_stats)
+    assert json.dumps(histo) == json.dumps(ref_histo)
+    assert medias == ref_medias
+
+
+def test_extra_and_missing_columns():
+    df = pd.DataFrame({" Nom ": ["A", "B"], "Divers": [1, 2]})
+    records, stats, histo, medias = current(df.copy())
+    assert without_ids(records) == without_ids(reference_load(df.copy())[0])
+    assert [r["global"] for r in records] == ["Autre", "Autre"] and histo == {}
+
+
+def test_no_name_column():
+    works, stats, histo, medias = build_dataset(pd.DataFrame({"Titre": ["A"]}))
+    assert len(works) == 0 and medias == []
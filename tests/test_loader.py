@@ -0,0 +1,85 @@
+import time
+
+import pytest
+
+from instrument import recent
+from loader import SheetLoader, sheet_ids_from
+
+
+def test_sheet_ids_from():
+    assert sheet_ids_from(["a, b", "a,c_-1"]) == ["a", "b", "c_-1"]
+    assert sheet_ids_from("../etc, a/b, ok, %2e%2e, , x" + "y" * 200) == ["ok"]
+    assert sheet_ids_from([",".join(f"s{n}" for n in range(50))], limit=8) == [f"s{n}" for n in range(8)]
+
+
+def test_loader_rejects_invalid_ids():
+    loader = SheetLoader(parse_workers=0)
+    with pytest.raises(ValueError):
+        loader.get("../../tmp/x")
+    assert loader.syncs == {}
+
+
+class FailingSync:
+    # Sheet qui échoue tout de suite : le future peut être terminé avant l'enregistrement du rappel
+    calls = 0
+
+    def __init__(self, url, **kwargs):
+        self.latest = self.checked_at = None
+        self.counters = {}
+
+    def sync(self):
+        FailingSync.calls += 1
+        raise RuntimeError("export indisponible")
+
+    def current(self):
+        return None
+
+    def footprint(self):
+        return 0
+
+
+def failed(loader, sheet_id):
+    # done() tourne dans le thread du pool, parfois juste après le retour de future.result()
+    for _ in range(500):
+        with loader.lock:
+            if loader.failures.get(sheet_id): return True
+        time.sleep(0.01)
+    return False
+
+
+def test_fast_failure_does_not_deadlock(monkeypatch):
+    import threading
+
+    import loader as module
+    monkeypatch.setattr(module, "SheetSync", FailingSync)
+    loader = SheetLoader(parse_workers=0, fetch_workers=1)
+    for _ in range(20):
+        done = threading.Event()
+        threading.Thread(target=lambda: (loader.load("sheet"), done.set()), daemon=True).start()
+        assert done.wait(5), "load() bloqué"
+        assert failed(loader, "sheet")
+        with loader.lock:
+            loader.due.pop("sheet", None) # Pas de relance par le thread de fond pendant le test
+            loader.failures.pop("sheet") # Le prochain load() attend de nouveau une première tentative
+
+
+def test_failed_cold_sheet_is_not_refetched_by_reruns(monkeypatch):
+    import loader as module
+    monkeypatch.setattr(module, "SheetSync", FailingSync)
+    loader = SheetLoader(refresh=3600, parse_workers=0) # Prochain essai du thread de fond dans une demi-heure au plus tôt
+    assert loader.load("sheet") is None and failed(loader, "sheet") # Première tentative attendue, en échec
+    calls = FailingSync.calls
+    for _ in range(5): loader.load("sheet")
+    assert FailingSync.calls == calls and loader.failures["sheet"] == 1
+    assert recent("retry", limit=1, sheet="sheet")[0]["failures"] == 1 # Prochain essai journalisé
+
+
+def test_eviction_callbacks(monkeypatch):
+    import loader as module
+    monkeypatch.setattr(module, "SheetSync", FailingSync)
+    loader = SheetLoader(parse_workers=0, max_sheets=1)
+    evicted = []
+    loader.on_evict.append(evicted.append)
+    loader.get("a"); loader.get("b")
+    loader.evict(keep={"b"})
+    assert evicted == ["a"] and list(loader.syncs) == ["b"]
@@ -0,0 +1,26 @@
+import os
+
+import pandas as pd
+
+import payload
+from engine import build_dataset
+
+
+def test_pruning_is_per_sheet(tmp_path, monkeypatch):
+    monkeypatch.setattr(payload, "REVIEWS_DIR", str(tmp_path))
+    assert payload.publish_reviews([{"x": "review"}], "b1", "b") == "app/static/reviews/b/b1"
+    for n in range(5):
+        payload.publish_reviews([], f"a{n}", "a")
+        os.utime(tmp_path / "a" / f"a{n}", (n, n)) # Ordre des mtime garanti
+    assert sorted(os.listdir(tmp_path / "a")) == ["a2", "a3", "a4"]
+    assert os.listdir(tmp_path / "b") == ["b1"] and os.listdir(tmp_path / "b" / "b1") == ["0.json"]
+
+
+def test_ensure_reviews_republishes(tmp_path, monkeypatch):
+    monkeypatch.setattr(payload, "REVIEWS_DIR", str(tmp_path))
+    works = build_dataset(pd.DataFrame({"Nom": ["A", "B"], "Review": ["Une longue review", ""]}))[0]
+    payload.ensure_reviews(works, "v1", "s")
+    assert os.listdir(tmp_path / "s" / "v1") == ["0.json"]
+    os.remove(tmp_path / "s" / "v1" / "0.json"); os.rmdir(tmp_path / "s" / "v1")
+    payload.ensure_reviews(works, "v1", "s")
+    assert os.listdir(tmp_path / "s" / "v1") == ["0.json"]
@@ -0,0 +1,65 @@
+import json
+import re
+import shutil
+import subprocess
+from bisect import bisect_left
+
+import pandas as pd
+import pytest
+
+from engine import build_dataset
+from page import HTML_TEMPLATE
+from payload import fold, search_index, tokens
+
+TEXTS = ["Œuvre Épique", "L'Étranger", "Æon Flux", "Die Straße", "Pokémon : Rouge/Bleu", "ﬁnal ﬁght", "Spider-Man_2 (2004)",
+         "İstanbul", "Ｆｕｌｌ ｗｉｄｔｈ", "Cœur ½ — x²", "naïve café", "ÇA"]
+
+
+def search(index, q):
+    # Comme searchBits (page.py) : chaque mot tapé = préfixe d'un token du vocabulaire trié, ET entre les mots
+    found = None
+    for w in tokens(q) or ():
+        hits = set()
+        for k in range(bisect_left(index["v"], w), bisect_left(index["v"], w + "\uffff")):
+            i = 0
+            for g in index["p"][k]:
+                i += g
+                hits.add(i)
+        found = hits if found is None else found & hits
+    return found
+
+
+def titles(*noms):
+    works = build_dataset(pd.DataFrame({"Nom": list(noms)}))[0]
+    return works, search_index(works)
+
+
+def test_substring_search():
+    works, index = titles("Batman", "Superman", "Manga Café", "Le Cœur des Hommes", "Dune")
+    find = lambda q: sorted(works.nom[i] for i in search(index, q))
+    assert find("man") == ["Batman", "Manga Café", "Superman"] # Sous-chaîne, comme l'ancienne recherche
+    assert find("MAN cafe") == ["Manga Café"]
+    assert find("coeur") == find("cœur") == find("œur") == ["Le Cœur des Hommes"]
+    assert find("zzz") == [] and find("une") == ["Dune"]
+
+
+def test_postings_are_gaps():
+    works, index = titles(*[f"Titre {n}" for n in range(5)])
+    assert index["p"][index["v"].index("titre")] == [0, 1, 1, 1, 1]
+    assert search(index, "titre") == set(range(5))
+
+
+def test_fold():
+    assert fold("Œuvre Épique") == "oeuvre epique" and fold("Die Straße") == "die strasse"
+    assert tokens("Spider-Man_2 (2004)") == {"spider", "man", "2", "2004"}
+
+
+@pytest.mark.skipif(shutil.which("node") is None, reason="node absent")
+def test_fold_matches_page():
+    # fold() et découpage en mots de la page (JS) = fold() / tokens() côté Python, sinon un mot tapé ne retrouve pas son token
+    js = HTML_TEMPLATE[HTML_TEMPLATE.index("function fold(s)"):HTML_TEMPLATE.index("function lowerBound")]
+    split = re.search(r"fold\(q\)\.split\((/.+?/u)\)", HTML_TEMPLATE).group(1)
+    script = (js + f"console.log(JSON.stringify({json.dumps(TEXTS)}.map(t => [fold(t), fold(t).split({split}).filter(Boolean)])));")
+    out = subprocess.run(["node", "-e", script.replace("{{", "{").replace("}}", "}")], capture_output=True, text=True, check=True).stdout
+    for t, (folded, words) in zip(TEXTS, json.loads(out)):
+        assert folded == fold(t) and set(words) == tokens(t), t
@@ -0,0 +1,122 @@
+import hashlib
+import io
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+import urllib3
+
+import instrument
+from engine import build_dataset
+from ingest import SourceReader, read_frame
+from snapshot import SnapshotStore
+from sync import SheetSync
+
+
+class Sheet(BaseHTTPRequestHandler):
+    # Export CSV local avec ETag ; truncate : corps coupé en cours de route (Content-Length annoncé complet)
+    body, truncate = b"", False
+
+    def do_GET(self):
+        etag = '"%s"' % hashlib.sha1(self.body).hexdigest()
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(self.body)))
+        self.end_headers()
+        self.wfile.write(self.body[:len(self.body) // 2] if self.truncate else self.body)
+        if self.truncate: self.close_connection = True
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Sheet)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+    Sheet.body, Sheet.truncate = b"", False
+
+
+def csv(*noms):
+    rows = "".join(f"{n},Film,Cool,01/01/2024,{'x' * 200}\n" for n in noms)
+    return ("Nom,Média global,Rank,Fin,Review\n" + rows).encode()
+
+
+@pytest.mark.parametrize("stream_min_bytes", [1 << 30, 0], ids=["download", "stream"])
+def test_truncated_body_keeps_previous_validators(server, stream_min_bytes, caplog, capsys):
+    sync = SheetSync(f"http://127.0.0.1:{server.server_port}/export", stream_min_bytes=stream_min_bytes)
+    Sheet.body = csv("A")
+    assert len(sync.sync()[0]) == 1
+
+    Sheet.body, Sheet.truncate = csv("A", "B"), True
+    with pytest.raises((requests.RequestException, urllib3.exceptions.HTTPError)): # Flux : lu sur resp.raw
+        sync.sync()
+    assert len(sync.current()[0][0]) == 1
+    assert "error" in instrument.recent("sync", limit=1)[0] # Échec journalisé (logger "retro"), pas affiché
+    assert any(r.name == "retro" and r.levelname == "WARNING" for r in caplog.records) and capsys.readouterr().out == ""
+
+    # Corps complet au prochain passage : pas de 304 sur la version jamais chargée
+    Sheet.truncate = False
+    for _ in range(3):
+        assert len(sync.sync()[0]) == 2
+    assert sync.counters["misses"] == 2 and sync.counters["not_modified"] == 2
+
+
+def test_seeded_sheet_keeps_its_footprint(server, tmp_path):
+    # Reprise depuis la snapshot : l'empreinte (plafond mémoire du loader) ne retombe pas à 0, même sur un hit
+    url = f"http://127.0.0.1:{server.server_port}/export"
+    Sheet.body = csv("A", "B", "C")
+    first = SheetSync(url, store=SnapshotStore("s", str(tmp_path)))
+    first.sync()
+    assert first.footprint() > 0
+
+    seeded = SheetSync(url, store=SnapshotStore("s", str(tmp_path)))
+    assert seeded.footprint() == first.footprint()
+    seeded.sync()
+    assert seeded.counters["hits"] == 1 and seeded.footprint() == first.footprint()
+
+
+HEADER = "Nom,Média global,Média,Rank,Fin,Genres,Tags,Review\n"
+DUNE = 'Dune,Livre,Roman,Cool,05/01/2024,"SF, Aventure",Culte,Un classique relu\n'
+ZELDA = 'Zelda,Jeu vidéo,Switch,Parfait,10/02/2024,"Aventure, Action",Épique,Immense\n'
+ALIEN = 'Alien,Film,,Sympa,03/01/2024,"SF, Horreur",,\n'
+ALIEN_EDIT = 'Alien,Film,,Cool,03/01/2024,"SF, Horreur, Drame",,\n'
+HEAT = 'Heat,Film,Cinéma,Cool +,,Action,Long,\n'
+PERSONA = 'Persona,Jeu vidéo,PS5,Coup de cœur,20/02/2024,RPG,"Long, Culte",Trop long\n'
+TOTORO = 'Totoro,Anime,Film anime,Parfait,15/03/2024,Fantasy,Cosy,\n'
+BATMAN = 'Batman,Film,Cinéma,Cool,01/03/2024,"Action, Drame",Sombre,Nuit\n'
+
+VERSIONS = [
+    ([DUNE, ZELDA, ALIEN, HEAT, PERSONA, TOTORO], 6),
+    # Dune supprimé (premier SF / Culte / Livre), Alien modifié, Batman inséré en tête, Zelda en double (déjà dérivé)
+    ([BATMAN, ZELDA, ALIEN_EDIT, HEAT, PERSONA, TOTORO, ZELDA], 2),
+    ([DUNE, ZELDA, ALIEN, HEAT, PERSONA, TOTORO], 2), # Retour : Dune et l'ancien Alien, sortis du cache de lignes
+]
+
+
+def test_incremental_sync_matches_full_build(server):
+    # Seules les lignes jamais vues sont re-dérivées ; le résultat (ordre des clés de stats / histo compris)
+    # est celui d'une construction complète sur le nouveau CSV
+    sync = SheetSync(f"http://127.0.0.1:{server.server_port}/export")
+    for n, (rows, changed) in enumerate(VERSIONS, 1):
+        Sheet.body = (HEADER + "".join(rows)).encode()
+        before = sync.counters["rows_reprocessed"]
+        works, stats, histo, medias = sync.sync()
+        assert sync.counters["rows_reprocessed"] - before == changed
+        assert sync.counters["misses"] == n
+
+        ref_works, ref_stats, ref_histo, ref_medias = build_dataset(read_frame(SourceReader(io.BytesIO(Sheet.body))))
+        assert works.records() == ref_works.records()
+        assert json.dumps(stats) == json.dumps(ref_stats) and json.dumps(histo) == json.dumps(ref_histo)
+        assert medias == ref_medias
+    sync.sync()
+    assert sync.counters["hits"] == 1 and sync.counters["not_modified"] == 1